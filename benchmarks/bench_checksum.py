@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020 - Odd Strabo <oddstr13@openshell.no>
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+
+"""
+Compare the single-pass checksum engine against one `checksum_file` pass per algorithm.
+
+    python benchmarks/bench_checksum.py --files 8 --size 64
+"""
+
+import os
+import sys
+import time
+import hashlib
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import click  # noqa: E402
+import jprm  # noqa: E402
+
+
+def legacy_checksum_file(path, checksum_type='md5'):
+    # checksum_file as of jprm 1.1.0
+    cs = hashlib.new(checksum_type)
+
+    with open(path, "rb") as fh:
+        data = True
+        while data:
+            data = fh.read(1_048_576)
+            if data:
+                cs.update(data)
+
+    return cs.hexdigest()
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+@click.command()
+@click.option('--files', default=8, type=click.IntRange(min=1), help='Number of files to hash (8)')
+@click.option('--size', default=64, type=click.IntRange(min=1), help='Size of each file in MiB (64)')
+@click.option('--jobs', default=None, type=click.IntRange(min=1), help='Threads for the parallel run (cpu count)')
+@click.option('checksum_types', '--checksum', '-c', default=['md5', 'sha256', 'sha512'], multiple=True)
+def main(files, size, jobs, checksum_types):
+    with tempfile.TemporaryDirectory() as tempdir:
+        paths = []
+        for i in range(files):
+            path = os.path.join(tempdir, 'file{}.bin'.format(i))
+            with open(path, 'wb') as fh:
+                for _ in range(size):
+                    fh.write(os.urandom(1_048_576))
+            paths.append(path)
+
+        total = files * size
+
+        legacy_time, legacy = timed(lambda: {
+            path: {t: legacy_checksum_file(path, t) for t in checksum_types} for path in paths
+        })
+        serial_time, serial = timed(lambda: jprm.checksum_files(paths, checksum_types, jobs=1))
+        parallel_time, parallel = timed(lambda: jprm.checksum_files(paths, checksum_types, jobs=jobs))
+
+        assert legacy == serial == parallel
+
+        click.echo('{} files, {} MiB, {}'.format(files, total, ', '.join(checksum_types)))
+        for name, seconds in (
+            ('legacy checksum_file per type', legacy_time),
+            ('checksum_files, 1 thread', serial_time),
+            ('checksum_files, thread pool', parallel_time),
+        ):
+            click.echo('{:32} {:8.3f} s {:10.1f} MiB/s {:6.2f}x'.format(name, seconds, total / seconds, legacy_time / seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020 - Odd Strabo <oddstr13@openshell.no>
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+
+"""
+Measure the cold start of jprm subcommands: wall clock time of a fresh interpreter running
+each command, and the import time of jprm and its heaviest imports from `python -X importtime`.
+
+    python benchmarks/bench_startup.py --runs 10 --json startup.json
+"""
+
+import os
+import sys
+import json
+import time
+import statistics
+import subprocess
+import tempfile
+
+import click
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def run(args, env, importtime=False):
+    cmd = [sys.executable]
+    if importtime:
+        cmd.append('-X')
+        cmd.append('importtime')
+    cmd.extend(['-m', 'jprm'] + args)
+
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    seconds = time.perf_counter() - start
+    if proc.returncode:
+        raise click.ClickException('`{}` failed: {}'.format(' '.join(args), proc.stderr.decode()))
+    return seconds, proc.stderr.decode()
+
+
+def parse_importtime(stderr):
+    """
+    Cumulative import time in seconds of each module, from `-X importtime` output.
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _self, cumulative, name = line[len('import time:'):].split('|')
+        modules.setdefault(name.strip(), int(cumulative) / 1_000_000)
+    return modules
+
+
+@click.command()
+@click.option('--runs', default=10, type=click.IntRange(min=1), help='Runs of each command (10)')
+@click.option('--top', default=5, type=click.IntRange(min=0), help='Number of slowest imports to list per command (5)')
+@click.option('json_file', '--json', default=None, type=click.Path(dir_okay=False, writable=True),
+              help='Write the results to this JSON file')
+def main(runs, top, json_file):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT] + sys.path))
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        repo_path = os.path.join(tempdir, 'manifest.json')
+        run(['repo', 'init', repo_path], env)
+
+        commands = {
+            '--help': ['--help'],
+            'plugin build --help': ['plugin', 'build', '--help'],
+            'repo list': ['repo', 'list', repo_path],
+            'repo compact': ['repo', 'compact', repo_path],
+            'repo verify': ['repo', 'verify', repo_path],
+        }
+
+        results = []
+        baseline = statistics.median(
+            timed(lambda: subprocess.run([sys.executable, '-c', 'pass'], check=True)) for _ in range(runs)
+        )
+        for name, args in commands.items():
+            wall = statistics.median(run(args, env)[0] for _ in range(runs))
+            modules = parse_importtime(run(args, env, importtime=True)[1])
+            jprm_import = modules.get('jprm', 0)
+            # Top level imports only, which is where the cost is decided
+            slowest = sorted(
+                ((module, seconds) for module, seconds in modules.items() if '.' not in module and module != 'jprm'),
+                key=lambda item: item[1],
+                reverse=True,
+            )[:top]
+            results.append({
+                'command': name,
+                'wall': wall,
+                'jprm_import': jprm_import,
+                'slowest_imports': dict(slowest),
+            })
+
+    click.echo('python startup {:.1f} ms, median of {} runs'.format(baseline * 1000, runs))
+    for result in results:
+        click.echo('{:24} {:8.1f} ms wall {:8.1f} ms import jprm   {}'.format(
+            result['command'],
+            result['wall'] * 1000,
+            result['jprm_import'] * 1000,
+            ', '.join('{} {:.1f}'.format(module, seconds * 1000) for module, seconds in result['slowest_imports'].items()),
+        ))
+
+    if json_file is not None:
+        with open(json_file, 'w') as fh:
+            json.dump({'python': sys.version, 'runs': runs, 'baseline': baseline, 'commands': results}, fh, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020 - Odd Strabo <oddstr13@openshell.no>
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+
+"""
+Time jprm against synthetic repositories and plugin archives, and compare results across commits.
+
+    python benchmarks/bench_suite.py --plugins 5000 --versions 200 --json before.json
+    git checkout ...
+    python benchmarks/bench_suite.py --plugins 5000 --versions 200 --json after.json --compare before.json
+
+Benchmarks can be picked with `--only`, e.g. `--only repo-add --only repo-list`.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import zipfile
+import datetime
+import platform
+import statistics
+import subprocess
+import tempfile
+import uuid
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+import click  # noqa: E402
+from click.testing import CliRunner  # noqa: E402
+import jprm  # noqa: E402
+
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+def plugin_meta(index, version):
+    rng = random.Random(index)
+    return {
+        "guid": str(uuid.UUID(int=rng.getrandbits(128))),
+        "name": "Synthetic Plugin {}".format(index),
+        "description": "Synthetic plugin number {}".format(index),
+        "overview": "Benchmark plugin",
+        "owner": "jprm",
+        "category": "General",
+        "version": version,
+        "changelog": "Release {}".format(version),
+        "targetAbi": "10.8.0.0",
+        "timestamp": "2022-07-12T00:00:00Z",
+    }
+
+
+def version_string(index):
+    return "{}.{}.{}.0".format(1 + index // 100, (index // 10) % 10, index % 10)
+
+
+def make_repository(repo_dir, plugins, versions):
+    """
+    Write a manifest of `plugins` plugins with `versions` versions each, newest first.
+    """
+    manifest = []
+    for i in range(plugins):
+        meta = plugin_meta(i, None)
+        slug = jprm.plugin_slug(meta["name"])
+        entry = {key: meta[key] for key in ("guid", "name", "description", "overview", "owner", "category")}
+        entry["versions"] = [
+            {
+                "version": version_string(v),
+                "changelog": "Release {}".format(version_string(v)),
+                "targetAbi": meta["targetAbi"],
+                "sourceUrl": "https://repo.example.com/{slug}/{slug}_{version}.zip".format(
+                    slug=slug, version=version_string(v)),
+                "checksum": "{:032x}".format(random.Random(i * 100_000 + v).getrandbits(128)),
+                "timestamp": meta["timestamp"],
+            }
+            for v in reversed(range(versions))
+        ]
+        manifest.append(entry)
+
+    repo_path = os.path.join(repo_dir, "manifest.json")
+    with open(repo_path, "w") as fh:
+        json.dump(manifest, fh, indent=4)
+    return repo_path, manifest
+
+
+def make_payload(size, seed=0):
+    # Somewhat compressible, like a .NET assembly
+    rng = random.Random(seed)
+    words = [bytes(rng.randrange(256) for _ in range(rng.randrange(2, 12))) for _ in range(1024)]
+    chunks = []
+    total = 0
+    while total < size:
+        chunk = b"".join(rng.choices(words, k=1024))
+        chunks.append(chunk)
+        total += len(chunk)
+    return b"".join(chunks)[:size]
+
+
+def make_plugin_zip(filename, index, version, payload):
+    with zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(jprm.JSON_METADATA_FILE, json.dumps(plugin_meta(index, version)))
+        zf.writestr("Synthetic.dll", payload)
+
+
+def invoke(args):
+    result = CliRunner().invoke(jprm.cli, ["--verbosity", "ERROR"] + args, catch_exceptions=False)
+    if result.exit_code:
+        raise click.ClickException("`jprm {}` failed:\n{}".format(" ".join(args), result.output))
+    return result
+
+
+def measure(runs, func, setup=None):
+    times = []
+    for _ in range(runs):
+        state = setup() if setup is not None else None
+        start = time.perf_counter()
+        func(state)
+        times.append(time.perf_counter() - start)
+    return {
+        "median": statistics.median(times),
+        "min": min(times),
+        "runs": runs,
+    }
+
+
+class Workspace(object):
+    """
+    Synthetic inputs, generated once and shared by the benchmarks.
+    """
+
+    def __init__(self, tempdir, plugins, versions, size):
+        self.tempdir = tempdir
+        self.plugins = plugins
+        self.versions = versions
+        self.size = size
+        self._repo = None
+        self._zips = None
+        self._payload = None
+
+    @property
+    def payload(self):
+        if self._payload is None:
+            self._payload = make_payload(self.size)
+        return self._payload
+
+    @property
+    def repo(self):
+        if self._repo is None:
+            repo_dir = os.path.join(self.tempdir, "repo-template")
+            os.makedirs(repo_dir)
+            click.echo("Generating a repository of {} plugins x {} versions".format(self.plugins, self.versions), err=True)
+            self._repo = make_repository(repo_dir, self.plugins, self.versions)
+        return self._repo
+
+    @property
+    def zips(self):
+        """
+        New versions of the first few plugins of the repository, and a new plugin.
+        """
+        if self._zips is None:
+            zip_dir = os.path.join(self.tempdir, "zips")
+            os.makedirs(zip_dir)
+            self._zips = []
+            for index in list(range(min(self.plugins, 4))) + [self.plugins]:
+                filename = os.path.join(zip_dir, "plugin{}.zip".format(index))
+                make_plugin_zip(filename, index, version_string(self.versions), self.payload)
+                self._zips.append(filename)
+        return self._zips
+
+    def fresh_repo(self):
+        repo_dir = tempfile.mkdtemp(dir=self.tempdir)
+        repo_path = os.path.join(repo_dir, "manifest.json")
+        shutil.copyfile(self.repo[0], repo_path)
+        return repo_path
+
+
+@benchmark("repo-add")
+def bench_repo_add(ws, runs):
+    return measure(runs, lambda repo_path: invoke(["repo", "add", "--no-cache", repo_path] + ws.zips), ws.fresh_repo)
+
+
+@benchmark("repo-list")
+def bench_repo_list(ws, runs):
+    repo_path = ws.fresh_repo()
+    return measure(runs, lambda _: invoke(["repo", "list", repo_path]))
+
+
+@benchmark("repo-remove")
+def bench_repo_remove(ws, runs):
+    guid = ws.repo[1][ws.plugins // 2]["guid"]
+    return measure(runs, lambda repo_path: invoke(["repo", "remove", repo_path, guid]), ws.fresh_repo)
+
+
+@benchmark("update-plugin-manifest")
+def bench_update_plugin_manifest(ws, runs):
+    def setup():
+        _repo_path, manifest = ws.repo
+        return [
+            (json.loads(json.dumps(manifest[i])), {
+                "guid": manifest[i]["guid"],
+                "versions": [dict(manifest[i]["versions"][0], version=version_string(ws.versions + 1))],
+            })
+            for i in range(min(ws.plugins, 100))
+        ]
+
+    def run(pairs):
+        for old, new in pairs:
+            jprm.update_plugin_manifest(old, new)
+
+    return measure(runs, run, setup)
+
+
+@benchmark("checksum-file")
+def bench_checksum_file(ws, runs):
+    filename = os.path.join(ws.tempdir, "payload.bin")
+    with open(filename, "wb") as fh:
+        fh.write(ws.payload)
+    return measure(runs, lambda _: jprm.checksum_file(filename))
+
+
+@benchmark("zip-path")
+def bench_zip_path(ws, runs):
+    source = os.path.join(ws.tempdir, "zip-source")
+    if not os.path.exists(source):
+        os.makedirs(source)
+        for i in range(8):
+            with open(os.path.join(source, "Library{}.dll".format(i)), "wb") as fh:
+                fh.write(ws.payload[i * len(ws.payload) // 8:(i + 1) * len(ws.payload) // 8])
+    target = os.path.join(ws.tempdir, "zip-path.zip")
+    return measure(runs, lambda _: jprm.zip_path(target, source))
+
+
+@benchmark("package-plugin")
+def bench_package_plugin(ws, runs):
+    plugin_dir = os.path.join(ws.tempdir, "plugin")
+    bin_dir = os.path.join(plugin_dir, "bin")
+    output = os.path.join(plugin_dir, "artifacts")
+    if not os.path.exists(plugin_dir):
+        os.makedirs(bin_dir)
+        os.makedirs(output)
+        with open(os.path.join(bin_dir, "Synthetic.dll"), "wb") as fh:
+            fh.write(ws.payload)
+        meta = plugin_meta(0, "1.0.0.0")
+        meta["artifacts"] = ["Synthetic.dll"]
+        with open(os.path.join(plugin_dir, "jprm.yaml"), "w") as fh:
+            json.dump(meta, fh)  # JSON is YAML
+
+    return measure(runs, lambda _: jprm.package_plugin(plugin_dir, binary_path=bin_dir, output=output, reproducible=False))
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True,
+        ).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """
+    Print the change of each benchmark from `baseline`, and return the names of the regressions.
+    """
+    if baseline['parameters'] != results['parameters']:
+        click.echo("Warning: the baseline was run with {}".format(baseline['parameters']), err=True)
+
+    regressions = []
+    click.echo("{:24} {:>10} {:>10} {:>8}".format("", "baseline", "current", "ratio"))
+    for name, result in results['benchmarks'].items():
+        before = baseline['benchmarks'].get(name)
+        if before is None:
+            click.echo("{:24} {:>10} {:10.4f}".format(name, "-", result['median']))
+            continue
+
+        ratio = result['median'] / before['median']
+        flag = ''
+        if ratio > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        click.echo("{:24} {:10.4f} {:10.4f} {:7.2f}x{}".format(name, before['median'], result['median'], ratio, flag))
+
+    return regressions
+
+
+@click.command()
+@click.option('--plugins', default=500, type=click.IntRange(min=1), help='Plugins in the synthetic repository (500)')
+@click.option('--versions', default=20, type=click.IntRange(min=1), help='Versions of each plugin (20)')
+@click.option('--size', default=4, type=click.IntRange(min=1), help='Size of the synthetic plugin payload in MiB (4)')
+@click.option('--runs', default=5, type=click.IntRange(min=1), help='Runs of each benchmark (5)')
+@click.option('--only', default=[], multiple=True, type=click.Choice(sorted(BENCHMARKS)), help='Benchmarks to run (all)')
+@click.option('json_file', '--json', default=None, type=click.Path(dir_okay=False, writable=True),
+              help='Write the results to this JSON file')
+@click.option('--compare', 'baseline_file', default=None, type=click.Path(exists=True, dir_okay=False),
+              help='Compare with the results of an earlier run, from --json')
+@click.option('--threshold', default=1.2, type=float,
+              help='Slowdown from the baseline that counts as a regression, and fails the run (1.2)')
+def main(plugins, versions, size, runs, only, json_file, baseline_file, threshold):
+    results = {
+        'commit': git_commit(),
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'parameters': {'plugins': plugins, 'versions': versions, 'size': size},
+        'benchmarks': {},
+    }
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        ws = Workspace(tempdir, plugins, versions, size * 1_048_576)
+        for name in only or BENCHMARKS:
+            click.echo("Running {}".format(name), err=True)
+            results['benchmarks'][name] = BENCHMARKS[name](ws, runs)
+
+    if json_file is not None:
+        with open(json_file, 'w') as fh:
+            json.dump(results, fh, indent=4)
+
+    if baseline_file is not None:
+        with open(baseline_file, 'r') as fh:
+            baseline = json.load(fh)
+        if compare(results, baseline, threshold):
+            sys.exit(1)
+    else:
+        for name, result in results['benchmarks'].items():
+            click.echo("{:24} {:10.4f} s median {:10.4f} s min".format(name, result['median'], result['min']))
+
+
+if __name__ == '__main__':
+    main()
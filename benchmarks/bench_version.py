@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020 - Odd Strabo <oddstr13@openshell.no>
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+
+"""
+Microbenchmarks for parsing and sorting versions.
+
+    python benchmarks/bench_version.py --count 100000
+"""
+
+import os
+import re
+import sys
+import time
+import random
+from functools import total_ordering
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import click  # noqa: E402
+import jprm  # noqa: E402
+
+
+@total_ordering
+class LegacyVersion(object):
+    # The parsing and comparison parts of Version as of jprm 1.1.0
+    version_re = re.compile(r'^(?P<major>[0-9]+)(\.(?P<minor>[0-9]+)(\.(?P<build>[0-9]+)(\.(?P<revision>[0-9]+))?)?)?$')
+
+    major = None
+    minor = None
+    build = None
+    revision = None
+
+    def __init__(self, version):
+        if isinstance(version, LegacyVersion):
+            self.major = version.major
+            self.minor = version.minor
+            self.build = version.build
+            self.revision = version.revision
+
+        elif isinstance(version, str):
+            match = self.version_re.match(version)
+            if not match:
+                raise ValueError(version)
+
+            gd = match.groupdict()
+            self.major = int(gd.get('major')) if gd.get('major') else None
+            self.minor = int(gd.get('minor')) if gd.get('minor') else None
+            self.build = int(gd.get('build')) if gd.get('build') else None
+            self.revision = int(gd.get('revision')) if gd.get('revision') else None
+
+        else:
+            raise TypeError(version)
+
+    @staticmethod
+    def _hasattrs(obj, *names):
+        for name in names:
+            if not hasattr(obj, name):
+                return False
+        return True
+
+    def __eq__(self, other):
+        if self._hasattrs(other, 'major', 'minor', 'build', 'revision'):
+            return (self.major or 0, self.minor or 0, self.build or 0, self.revision or 0) == \
+                (other.major or 0, other.minor or 0, other.build or 0, other.revision or 0)
+        return NotImplemented
+
+    def __lt__(self, other):
+        if self._hasattrs(other, 'major', 'minor', 'build', 'revision'):
+            return (self.major or 0, self.minor or 0, self.build or 0, self.revision or 0) < \
+                (other.major or 0, other.minor or 0, other.build or 0, other.revision or 0)
+        return NotImplemented
+
+
+def timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+@click.command()
+@click.option('--count', default=100_000, type=click.IntRange(min=1), help='Number of versions (100000)')
+@click.option('--distinct', default=5_000, type=click.IntRange(min=1), help='Number of distinct versions (5000)')
+@click.option('--repeat', default=3, type=click.IntRange(min=1), help='Runs per measurement, best is reported (3)')
+@click.option('--seed', default=0, type=int)
+def main(count, distinct, repeat, seed):
+    rng = random.Random(seed)
+    pool = ['{}.{}.{}.{}'.format(rng.randrange(20), rng.randrange(20), rng.randrange(3000), rng.randrange(60000))
+            for _ in range(distinct)]
+    versions = [rng.choice(pool) for _ in range(count)]
+    releases = [{'version': version} for version in versions]
+
+    def sort_releases_legacy():
+        sorted(releases, key=lambda release: LegacyVersion(release['version']), reverse=True)
+
+    def sort_releases():
+        jprm.sort_versions(list(releases), key=lambda release: release['version'], reverse=True)
+
+    legacy_parsed = [LegacyVersion(v) for v in versions]
+    parsed = [jprm.Version(v) for v in versions]
+
+    results = [
+        ('parse: legacy Version()', timed(lambda: [LegacyVersion(v) for v in versions], repeat)),
+        ('parse: Version()', timed(lambda: [jprm.Version(v) for v in versions], repeat)),
+        ('parse: Version.parse() (interned)', timed(lambda: [jprm.Version.parse(v) for v in versions], repeat)),
+        ('sort objects: legacy Version', timed(lambda: sorted(legacy_parsed), repeat)),
+        ('sort objects: Version', timed(lambda: sorted(parsed), repeat)),
+        ('sort releases: legacy key=Version', timed(sort_releases_legacy, repeat)),
+        ('sort releases: sort_versions', timed(sort_releases, repeat)),
+    ]
+
+    click.echo('{} versions, {} distinct'.format(count, distinct))
+    for name, seconds in results:
+        click.echo('{:36} {:8.3f} s {:10.0f} /s'.format(name, seconds, count / seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020 - Odd Strabo <oddstr13@openshell.no>
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+
+"""
+Compare the parallel zip writer against serially deflating every entry.
+
+    python benchmarks/bench_zip.py --files 16 --size 16
+"""
+
+import os
+import sys
+import time
+import random
+import zipfile
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import click  # noqa: E402
+import jprm  # noqa: E402
+
+
+def legacy_zip_path(fn, path, prefix=''):
+    # zip_path as of jprm 1.1.0
+    with zipfile.ZipFile(fn, "w", zipfile.ZIP_DEFLATED) as z:
+        for root, dirs, files in os.walk(path, topdown=True):
+            for d in dirs:
+                fp = os.path.join(root, d)
+                ap = os.path.join(prefix, os.path.relpath(fp, path))
+
+                if not ap:
+                    continue
+
+                z.write(fp, ap)
+
+            for f in files:
+                fp = os.path.join(root, f)
+                ap = os.path.join(prefix, os.path.relpath(fp, path))
+
+                z.write(fp, ap)
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+@click.command()
+@click.option('--files', default=16, type=click.IntRange(min=1), help='Number of libraries to package (16)')
+@click.option('--size', default=16, type=click.IntRange(min=1), help='Size of each library in MiB (16)')
+@click.option('--jobs', default=None, type=click.IntRange(min=1), help='Threads for the parallel run (cpu count)')
+def main(files, size, jobs):
+    rng = random.Random(0)
+    # Somewhat compressible, like native code
+    words = [bytes(rng.randrange(256) for _ in range(rng.randrange(2, 12))) for _ in range(4096)]
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        source = os.path.join(tempdir, 'src')
+        os.makedirs(source)
+        for i in range(files):
+            with open(os.path.join(source, 'lib{}.so'.format(i)), 'wb') as fh:
+                written = 0
+                while written < size * 1_048_576:
+                    chunk = b''.join(rng.choices(words, k=8192))
+                    fh.write(chunk)
+                    written += len(chunk)
+        with open(os.path.join(source, 'image.png'), 'wb') as fh:
+            fh.write(os.urandom(4 * 1_048_576))
+
+        total = sum(os.path.getsize(os.path.join(source, f)) for f in os.listdir(source)) / 1_048_576
+
+        def run(func):
+            fn = os.path.join(tempdir, 'out.zip')
+            seconds, _ = timed(lambda: func(fn))
+            return seconds, os.path.getsize(fn) / 1_048_576
+
+        results = (
+            ('legacy zip_path', run(lambda fn: legacy_zip_path(fn, source))),
+            ('zip_path, 1 thread', run(lambda fn: jprm.zip_path(fn, source, jobs=1))),
+            ('zip_path, thread pool', run(lambda fn: jprm.zip_path(fn, source, jobs=jobs))),
+            ('zip_path, level 1', run(lambda fn: jprm.zip_path(fn, source, compresslevel=1, jobs=jobs))),
+        )
+
+        click.echo('{} files, {:.1f} MiB'.format(files + 1, total))
+        legacy_time = results[0][1][0]
+        for name, (seconds, zip_size) in results:
+            click.echo('{:24} {:8.3f} s {:8.1f} MiB {:6.2f}x'.format(name, seconds, zip_size, legacy_time / seconds))
+
+
+if __name__ == '__main__':
+    main()
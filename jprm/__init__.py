@@ -10,22 +10,67 @@
 import os
 import json
 import hashlib
+import bisect
+import collections
+import contextlib
+import copy
 import datetime
+import errno
+import importlib
 from typing import Optional, Union
-import zipfile
-import subprocess
-import tempfile
-import shutil
+import sys
 import logging
-from functools import total_ordering
+from functools import lru_cache, total_ordering
 import re
+import threading
+import time
 import uuid
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
-import yaml
 import click
 import click_log
-from slugify import slugify
-import tabulate
+
+
+class _LazyModule(object):
+    """
+    Stand-in for a module that is imported the first time one of its attributes is used,
+    keeping start up fast for the commands that do not need it.
+    The global it is bound to is then replaced by the module itself.
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        importlib.import_module(self._name)
+        # `concurrent.futures` is used through the `concurrent` package
+        package = self._name.split('.')[0]
+        module = sys.modules[package]
+        globals()[package] = module
+        return getattr(module, attr)
+
+
+concurrent = _LazyModule('concurrent.futures')
+shutil = _LazyModule('shutil')
+sqlite3 = _LazyModule('sqlite3')
+subprocess = _LazyModule('subprocess')
+tabulate = _LazyModule('tabulate')
+tempfile = _LazyModule('tempfile')
+yaml = _LazyModule('yaml')
+zipfile = _LazyModule('zipfile')
+
+
+def slugify(text, **kwargs):
+    # python-slugify pulls in text-unidecode and regex
+    from slugify import slugify as _slugify
+    return _slugify(text, **kwargs)
+
 
 logger = logging.getLogger("jprm")
 click_log.basic_config(logger)
@@ -34,6 +79,33 @@ __version__ = "1.1.0"
 JSON_METADATA_FILE = "meta.json"
 DEFAULT_IMAGE_FILE = "image.png"
 DEFAULT_FRAMEWORK = "netstandard2.1"
+REPO_CONFIG_FILE = ".jprm-repo.yaml"
+BUILD_STATE_FILE = os.path.join("obj", "jprm-build.json")
+# Files besides the projects themselves that decide what `dotnet restore` resolves
+RESTORE_INPUT_FILES = (
+    "Directory.Build.props",
+    "Directory.Build.targets",
+    "Directory.Packages.props",
+    "NuGet.Config",
+    "nuget.config",
+    "global.json",
+    "packages.lock.json",
+)
+REPO_LAYOUTS = ("single", "sharded")
+REPO_PLACEMENTS = ("copy", "reflink", "hardlink", "auto")
+REPO_BLOB_MODES = ("none", "images", "all")
+BLOB_STORE_DIR = ".blobs"
+ZIP_FINGERPRINT_PREFIX = b"jprm-fingerprint:"
+# Already compressed formats, stored as they are when packaging
+ZIP_STORED_EXTENSIONS = frozenset([
+    ".png", ".jpg", ".jpeg", ".gif", ".webp",
+    ".zip", ".nupkg", ".gz", ".tgz", ".bz2", ".xz", ".7z",
+    ".mp3", ".mp4", ".woff", ".woff2",
+])
+# Earliest timestamp a zip file can hold, 1980-01-01T00:00:00Z
+ZIP_EPOCH = 315532800
+# Compressed zip entries waiting to be written are kept in memory up to this size, and on disk beyond it
+ZIP_SPOOL_SIZE = 8 * 1_048_576
 CONFIG_LOCATIONS = [
     "jprm.yaml",
     ".jprm.yaml",
@@ -47,59 +119,401 @@ CONFIG_LOCATIONS = [
 ####################
 
 
+CHECKSUM_BUFFER_SIZE = 1_048_576
+_checksum_buffers = threading.local()
+
+
+def checksum_stream(fsrc, checksum_types=('md5',), fdst=None):
+    """
+    Checksum everything read from the binary file object `fsrc` with each of `checksum_types`
+    in a single pass, optionally copying the data to `fdst` on the way through.
+    Returns a dict of hex digests keyed by checksum type.
+
+    Data is read into a buffer that is reused for every call made from the same thread.
+    """
+    checksums = [(checksum_type, hashlib.new(checksum_type)) for checksum_type in checksum_types]
+
+    view = getattr(_checksum_buffers, 'view', None)
+    if view is None:
+        view = _checksum_buffers.view = memoryview(bytearray(CHECKSUM_BUFFER_SIZE))
+
+    while True:
+        length = fsrc.readinto(view)
+        if not length:
+            break
+
+        data = view[:length]
+        for _, cs in checksums:
+            cs.update(data)
+        if fdst is not None:
+            fdst.write(data)
+
+    return {checksum_type: cs.hexdigest() for checksum_type, cs in checksums}
+
+
+def checksum_file_multi(path, checksum_types=('md5', 'sha256', 'sha512')):
+    with open(path, "rb", buffering=0) as fh:
+        return checksum_stream(fh, checksum_types)
+
+
 def checksum_file(path, checksum_type='md5'):
-    cs = hashlib.new(checksum_type)
+    return checksum_file_multi(path, (checksum_type,))[checksum_type]
+
+
+def checksum_files(paths, checksum_types=('md5',), jobs=None):
+    """
+    Checksum several files on a thread pool; hashlib and file reads release the GIL.
+    Returns a dict of `checksum_file_multi` results keyed by path.
+    """
+    paths = list(paths)
+    if jobs is None:
+        jobs = min(len(paths), os.cpu_count() or 1)
+
+    if jobs <= 1:
+        return {path: checksum_file_multi(path, checksum_types) for path in paths}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(lambda path: checksum_file_multi(path, checksum_types), paths)
+        return dict(zip(paths, results))
+
+
+def copyfileobj_checksum(fsrc, fdst, checksum_type='md5'):
+    """
+    Copy the contents of `fsrc` to `fdst`, checksumming the data on the way through.
+    """
+    return checksum_stream(fsrc, (checksum_type,), fdst=fdst)[checksum_type]
+
+
+def walk_entries(path, prefix=''):
+    """
+    List the `(arcname, filename)` of every directory and file below `path`, for `zip_entries`.
+    """
+    entries = []
+    for root, dirs, files in os.walk(path, topdown=True):
+        for d in dirs:
+            fp = os.path.join(root, d)
+            ap = os.path.join(prefix, os.path.relpath(fp, path))
+
+            if not ap:
+                continue
+
+            entries.append((ap, fp))
+
+        for f in files:
+            fp = os.path.join(root, f)
+            ap = os.path.join(prefix, os.path.relpath(fp, path))
+
+            entries.append((ap, fp))
+
+    return entries
+
+
+def _zip_entry_info(arcname, is_dir, date_time):
+    zinfo = zipfile.ZipInfo(arcname.replace(os.sep, '/') + ('/' if is_dir else ''), date_time)
+    zinfo.create_system = 3  # Unix, regardless of where the zip is made
+    if is_dir:
+        zinfo.external_attr = (0o40755 << 16) | 0x10
+    else:
+        zinfo.external_attr = 0o100644 << 16
+    return zinfo
+
+
+def zip_compress_type(arcname):
+    """
+    Compression for a zip entry; formats that are compressed already are stored as they are.
+    """
+    if os.path.splitext(arcname)[1].lower() in ZIP_STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def _compress_zip_entry(source, compress_type, compresslevel=None):
+    """
+    Compress a zip entry, a file path or bytes, ahead of `_write_compressed_zip_entry`.
+
+    Files are read in chunks, and their compressed data spooled to disk beyond `ZIP_SPOOL_SIZE`,
+    so memory use does not grow with the size of the entries being compressed at once.
+    Returns `(compress_type, crc, file_size, compress_size, data)`, where data is bytes,
+    a file object of the compressed data, or the path of a file to store as it is.
+    """
+    if compress_type == zipfile.ZIP_DEFLATED:
+        # The same raw deflate stream zipfile writes
+        compressor = zlib.compressobj(
+            zlib.Z_DEFAULT_COMPRESSION if compresslevel is None else compresslevel,
+            zlib.DEFLATED,
+            -15,
+        )
+    else:
+        compressor = None
+
+    if isinstance(source, bytes):
+        crc = zlib.crc32(source)
+        if compressor is not None:
+            compressed = compressor.compress(source) + compressor.flush()
+            if len(compressed) < len(source):
+                return compress_type, crc, len(source), len(compressed), compressed
+
+        return zipfile.ZIP_STORED, crc, len(source), len(source), source
+
+    crc = 0
+    file_size = 0
+    spool = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_SIZE) if compressor is not None else None
+    try:
+        with open(source, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(1_048_576), b''):
+                crc = zlib.crc32(chunk, crc)
+                file_size += len(chunk)
+                if spool is not None:
+                    spool.write(compressor.compress(chunk))
+
+        if spool is not None:
+            spool.write(compressor.flush())
+            if spool.tell() < file_size:
+                return compress_type, crc, file_size, spool.tell(), spool
+            spool.close()
+    except BaseException:
+        if spool is not None:
+            spool.close()
+        raise
+
+    return zipfile.ZIP_STORED, crc, file_size, file_size, source
+
+
+def _write_compressed_zip_entry(z, zinfo, compressed):
+    compress_type, crc, file_size, compress_size, data = compressed
+    zinfo.compress_type = compress_type
+    zinfo.CRC = crc
+    zinfo.file_size = file_size
+    zinfo.compress_size = compress_size
+    zip64 = file_size > zipfile.ZIP64_LIMIT or compress_size > zipfile.ZIP64_LIMIT
+
+    # zipfile has no way to add data that is already compressed,
+    # so this does what `ZipFile.writestr` does, minus the compression.
+    with contextlib.ExitStack() as stack, z._lock:
+        if isinstance(data, bytes):
+            fh = None
+        elif isinstance(data, str):
+            fh = stack.enter_context(open(data, 'rb'))
+        else:
+            fh = stack.enter_context(data)
+            fh.seek(0)
+
+        z._writecheck(zinfo)
+        z._didModify = True
+        zinfo.header_offset = z.fp.tell()
+        z.fp.write(zinfo.FileHeader(zip64))
+        if fh is None:
+            z.fp.write(data)
+        else:
+            shutil.copyfileobj(fh, z.fp, 1_048_576)
+        z.filelist.append(zinfo)
+        z.NameToInfo[zinfo.filename] = zinfo
+        z.start_dir = z.fp.tell()
+
+
+def zip_entries(fn, entries, date_time=None, comment=None, compresslevel=None, jobs=None):
+    """
+    Write a zip file of `entries`, a list of `(arcname, source)` where source is the path
+    of a file or directory, or the bytes of a file.
+
+    Entries are read and compressed by `jobs` threads (number of CPUs), and written in order.
+    Entries with extensions in `ZIP_STORED_EXTENSIONS`, or that do not get any smaller,
+    are stored uncompressed.
+
+    With `date_time`, every entry gets that timestamp and fixed permissions,
+    so the same entries always give the same zip file.
+
+    The zip is written next to `fn` and renamed over it, so a file `fn` was
+    hardlinked to (e.g. a repository archive) is left untouched.
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    files = [(ap, source) for ap, source in entries if isinstance(source, bytes) or not os.path.isdir(source)]
+
+    def compress(entry):
+        ap, source = entry
+        return _compress_zip_entry(source, zip_compress_type(ap), compresslevel)
+
+    with contextlib.ExitStack() as stack:
+        if jobs > 1 and len(files) > 1:
+            executor = stack.enter_context(concurrent.futures.ThreadPoolExecutor(max_workers=jobs))
+            # Keep a few entries compressed ahead of the writer, not the whole zip in memory.
+            pending = collections.deque()
+            queue = iter(files)
+
+            def compressed_files():
+                for entry in queue:
+                    pending.append(executor.submit(compress, entry))
+                    if len(pending) > jobs * 2:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+
+            compressed = compressed_files()
+            stack.callback(lambda: [future.cancel() for future in pending])
+        else:
+            compressed = map(compress, files)
+
+        tmpfile = '{filename}.{tag}.tmp'.format(filename=fn, tag=uuid.uuid4().hex)
+        stack.callback(lambda: os.path.exists(tmpfile) and os.remove(tmpfile))
+        z = stack.enter_context(zipfile.ZipFile(tmpfile, "w", zipfile.ZIP_DEFLATED))
+        for ap, source in entries:
+            if not isinstance(source, bytes) and os.path.isdir(source):
+                if date_time is None:
+                    z.write(source, ap)
+                else:
+                    z.writestr(_zip_entry_info(ap, True, date_time), b'')
+                continue
+
+            if date_time is not None:
+                zinfo = _zip_entry_info(ap, False, date_time)
+            elif isinstance(source, bytes):
+                zinfo = zipfile.ZipInfo(ap, time.localtime(time.time())[:6])
+                zinfo.external_attr = 0o644 << 16
+            else:
+                zinfo = zipfile.ZipInfo.from_file(source, ap)
+
+            _write_compressed_zip_entry(z, zinfo, next(compressed))
+
+        if comment is not None:
+            z.comment = comment
+
+        z.close()
+        os.replace(tmpfile, fn)
+
+
+def zip_path(fn, path, prefix='', date_time=None, compresslevel=None, jobs=None):
+    entries = walk_entries(path, prefix=prefix)
+    if date_time is not None:
+        entries.sort()
+
+    zip_entries(fn, entries, date_time=date_time, compresslevel=compresslevel, jobs=jobs)
+
+
+def zip_fingerprint(entries, date_time=None, compresslevel=None):
+    """
+    Fingerprint of the zip file `zip_entries` would write, from the names and contents of its entries.
+    """
+    fingerprint = hashlib.sha256(repr((date_time, compresslevel)).encode())
+    for ap, source in entries:
+        if isinstance(source, bytes):
+            digest = hashlib.sha256(source).hexdigest()
+        elif os.path.isdir(source):
+            digest = 'dir'
+        else:
+            digest = checksum_file(source, checksum_type='sha256')
+        fingerprint.update('{}\0{}\n'.format(ap.replace(os.sep, '/'), digest).encode())
+
+    return fingerprint.hexdigest()
+
+
+def read_zip_fingerprint(fn):
+    """
+    Fingerprint stored in the comment of a zip file written by `package_plugin`, or None.
+    """
+    try:
+        with zipfile.ZipFile(fn, 'r') as z:
+            comment = z.comment
+    except (OSError, zipfile.BadZipFile):
+        return None
+
+    if not comment.startswith(ZIP_FINGERPRINT_PREFIX):
+        return None
 
-    with open(path, "rb") as fh:
-        data = True
-        while data:
-            data = fh.read(1_048_576)
-            if data:
-                cs.update(data)
+    return comment[len(ZIP_FINGERPRINT_PREFIX):].decode('ascii', 'replace')
 
-    return cs.hexdigest()
 
+def get_source_date_epoch(path='.'):
+    """
+    Timestamp to build reproducibly from: `SOURCE_DATE_EPOCH` if set,
+    otherwise the time of the last git commit in `path`, or the start of the zip epoch.
+    """
+    if os.environ.get('SOURCE_DATE_EPOCH'):
+        return max(int(os.environ['SOURCE_DATE_EPOCH']), ZIP_EPOCH)
+
+    try:
+        stdout, stderr, retcode = run_os_command('git log -1 --format=%ct', cwd=path)
+    except OSError:
+        retcode = None
 
-def zip_path(fn, path, prefix=''):
+    if retcode == 0 and stdout.strip():
+        return max(int(stdout.strip()), ZIP_EPOCH)
 
-    with zipfile.ZipFile(fn, "w", zipfile.ZIP_DEFLATED) as z:
-        for root, dirs, files in os.walk(path, topdown=True):
-            for d in dirs:
-                fp = os.path.join(root, d)
-                ap = os.path.join(prefix, os.path.relpath(fp, path))
+    logger.warning("SOURCE_DATE_EPOCH is not set and `{}` is not a git checkout, using {}.".format(path, ZIP_EPOCH))
+    return ZIP_EPOCH
 
-                if not ap:
-                    continue
 
-                z.write(fp, ap)
+def _yaml_safe_loader():
+    # The libyaml based loader is several times faster, when PyYAML is built with it
+    return getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
 
-            for f in files:
-                fp = os.path.join(root, f)
-                ap = os.path.join(prefix, os.path.relpath(fp, path))
 
-                z.write(fp, ap)
+# abspath -> ((st_size, st_mtime_ns, st_ino), parsed manifest)
+_manifest_cache = {}
+_manifest_cache_lock = threading.Lock()
 
 
 def load_manifest(manifest_file_name):
     """
     Read in an arbitrary YAML manifest and return it
+
+    Parsed manifests are cached for as long as the file is unchanged;
+    every call returns a copy of its own to modify.
     """
+    key = os.path.abspath(manifest_file_name)
     with open(manifest_file_name, 'r') as manifest_file:
+        st = os.fstat(manifest_file.fileno())
+        signature = (st.st_size, st.st_mtime_ns, st.st_ino)
+
+        with _manifest_cache_lock:
+            cached = _manifest_cache.get(key)
+        if cached is not None and cached[0] == signature:
+            return copy.deepcopy(cached[1])
+
         try:
-            cfg = yaml.load(manifest_file, Loader=yaml.SafeLoader)
+            cfg = yaml.load(manifest_file, Loader=_yaml_safe_loader())
         except yaml.YAMLError as e:
             logger.error("Failed to load YAML manifest {}: {}".format(manifest_file_name, e))
             return None
-    return cfg
 
+    with _manifest_cache_lock:
+        _manifest_cache[key] = (signature, cfg)
+    return copy.deepcopy(cfg)
 
-def get_config(path):
+
+def find_config_files(path):
+    """
+    Paths of the config files present in `path`, in `CONFIG_LOCATIONS` order.
+    Each directory is listed once, instead of probing every location.
+    """
+    listings = {}
+
+    def names(dirname):
+        if dirname not in listings:
+            try:
+                with os.scandir(os.path.join(path, dirname)) as it:
+                    listings[dirname] = {entry.name for entry in it}
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                listings[dirname] = frozenset()
+        return listings[dirname]
+
+    config_files = []
     for config_file in CONFIG_LOCATIONS:
-        config_path = os.path.join(path, config_file)
-        if os.path.exists(config_path):
-            build_cfg = load_manifest(config_path)
-            if build_cfg is not None:
-                return build_cfg
+        dirname, filename = os.path.split(config_file)
+        if dirname and dirname not in names(''):
+            continue
+        if filename in names(dirname):
+            config_files.append(os.path.join(path, config_file))
+
+    return config_files
+
+
+def get_config(path):
+    for config_path in find_config_files(path):
+        build_cfg = load_manifest(config_path)
+        if build_cfg is not None:
+            return build_cfg
     logger.warning("Failed to locate config file.")
     return None
 
@@ -128,42 +542,200 @@ def run_os_command(command, environment=None, shell=False, cwd=None):
     return command_output.stdout.decode('utf8'), command_output.stderr.decode('utf8'), command_output.returncode
 
 
+class CommandResult(object):
+    """
+    Outcome of `run_command_streaming`: the exit status, the last lines of stdout and of stderr,
+    and the wall clock and CPU time (user + system, None where the OS does not tell) of the command.
+    """
+
+    def __init__(self, command, returncode, tail, stderr_tail, wall_time, cpu_time=None):
+        self.command = command
+        self.returncode = returncode
+        self.tail = tail
+        self.stderr_tail = stderr_tail
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+
+    @property
+    def output(self):
+        return '\n'.join(self.tail + self.stderr_tail)
+
+
+def _exit_status(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def run_command_streaming(command, environment=None, cwd=None, log_level=logging.INFO, tail_lines=200):
+    """
+    Run `command`, logging each line of its stdout and stderr at `log_level` as it arrives.
+    Only the last `tail_lines` lines of each are kept, for error reports.
+    """
+    cmd = command.split()
+    logger.debug(['run_command_streaming', cmd, environment, cwd])
+
+    tail = collections.deque(maxlen=tail_lines)
+    stderr_tail = collections.deque(maxlen=tail_lines)
+
+    def pump(stream, tail):
+        with stream:
+            for line in stream:
+                line = line.rstrip('\r\n')
+                tail.append(line)
+                logger.log(log_level, line)
+
+    start = time.monotonic()
+    proc = subprocess.Popen(
+        cmd,
+        env=environment,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+        encoding='utf8',
+        errors='replace',
+    )
+    stderr_thread = threading.Thread(target=pump, args=(proc.stderr, stderr_tail), daemon=True)
+    stderr_thread.start()
+    pump(proc.stdout, tail)
+    stderr_thread.join()
+
+    cpu_time = None
+    if hasattr(os, 'wait4'):
+        # Reap the process ourselves to get its resource usage; Popen keeps the returncode we set.
+        _pid, status, rusage = os.wait4(proc.pid, 0)
+        proc.returncode = _exit_status(status)
+        cpu_time = rusage.ru_utime + rusage.ru_stime
+    else:
+        proc.wait()
+
+    result = CommandResult(command, proc.returncode, list(tail), list(stderr_tail), time.monotonic() - start, cpu_time)
+    logger.debug("`{}` exited with {} after {:.2f}s{}".format(
+        command,
+        result.returncode,
+        result.wall_time,
+        '' if cpu_time is None else ', {:.2f}s CPU'.format(cpu_time),
+    ))
+    return result
+
+
 ####################
 
 
+def _pack_version(values):
+    major, minor, build, revision = values
+    major = major or 0
+    minor = minor or 0
+    build = build or 0
+    revision = revision or 0
+    if 0 <= major <= 0xFFFF and 0 <= minor <= 0xFFFF and 0 <= build <= 0xFFFF and 0 <= revision <= 0xFFFF:
+        return major << 48 | minor << 32 | build << 16 | revision
+    return None
+
+
 @total_ordering
 class Version(object):
-    version_re = re.compile(r'^(?P<major>[0-9]+)(\.(?P<minor>[0-9]+)(\.(?P<build>[0-9]+)(\.(?P<revision>[0-9]+))?)?)?$')
+    """
+    A version number of up to four parts; major, minor, build and revision.
+
+    Versions are compared on a precomputed key, packing the four parts into a single 64-bit
+    integer, 16 bits each. Versions with a part that does not fit in 16 bits are compared
+    part by part instead.
+    """
+    __slots__ = ('_values', '_key')
 
-    major = None
-    minor = None
-    build = None
-    revision = None
+    version_re = re.compile(r'^(?P<major>[0-9]+)(\.(?P<minor>[0-9]+)(\.(?P<build>[0-9]+)(\.(?P<revision>[0-9]+))?)?)?$')
 
     def __init__(self, version):
         if isinstance(version, Version):
-            self.major = version.major
-            self.minor = version.minor
-            self.build = version.build
-            self.revision = version.revision
+            values = version._values
 
         elif isinstance(version, str):
             match = self.version_re.match(version)
             if not match:
                 raise ValueError(version)
 
-            gd = match.groupdict()
-            self.major = int(gd.get('major')) if gd.get('major') else None
-            self.minor = int(gd.get('minor')) if gd.get('minor') else None
-            self.build = int(gd.get('build')) if gd.get('build') else None
-            self.revision = int(gd.get('revision')) if gd.get('revision') else None
+            major, minor, build, revision = match.group('major', 'minor', 'build', 'revision')
+            values = (
+                int(major),
+                int(minor) if minor else None,
+                int(build) if build else None,
+                int(revision) if revision else None,
+            )
 
         elif isinstance(version, int):
-            self.major = version
+            values = (version, None, None, None)
 
         else:
             raise TypeError(version)
 
+        self._values = values
+        self._key = _pack_version(values)
+
+    def _set(self, values):
+        self._values = values
+        self._key = _pack_version(values)
+
+    @classmethod
+    def parse(cls, version) -> 'FrozenVersion':
+        """
+        Returns a shared, immutable version, parsing each distinct version string only once.
+        """
+        if isinstance(version, FrozenVersion):
+            return version
+
+        if isinstance(version, Version):
+            return FrozenVersion(version)
+
+        return _parse_version(version)
+
+    @property
+    def major(self):
+        return self._values[0]
+
+    @major.setter
+    def major(self, value):
+        self._set_part(0, value)
+
+    @property
+    def minor(self):
+        return self._values[1]
+
+    @minor.setter
+    def minor(self, value):
+        self._set_part(1, value)
+
+    @property
+    def build(self):
+        return self._values[2]
+
+    @build.setter
+    def build(self, value):
+        self._set_part(2, value)
+
+    @property
+    def revision(self):
+        return self._values[3]
+
+    @revision.setter
+    def revision(self, value):
+        self._set_part(3, value)
+
+    def _set_part(self, index, value):
+        if value is not None:
+            value = int(value)
+
+        values = list(self._values)
+        values[index] = value
+        self._set(tuple(values))
+
+    @property
+    def sort_key(self) -> Optional[int]:
+        """
+        The packed 64-bit comparison key, or None if a part does not fit in 16 bits.
+        """
+        return self._key
+
     def full(self):
         return '{major}.{minor}.{build}.{revision}'.format(
             major = self.major or 0,
@@ -210,26 +782,30 @@ class Version(object):
         if value is not None:
             value = int(value)
 
+        major, minor, build, revision = self._values
+
         if key in ('major', 0):
-            self.major = value
+            major = value
             if value is None:
-                self.minor = None
-                self.build = None
-                self.revision = None
+                minor = None
+                build = None
+                revision = None
 
         if key in ('minor', 1):
-            self.minor = value
+            minor = value
             if value is None:
-                self.build = None
-                self.revision = None
+                build = None
+                revision = None
 
         if key in ('build', 2):
-            self.build = value
+            build = value
             if value is None:
-                self.revision = None
+                revision = None
 
         if key in ('revision', 3):
-            self.revision = value
+            revision = value
+
+        self._set((major, minor, build, revision))
 
     def __delitem__(self, key):
         self[key] = None
@@ -244,7 +820,7 @@ class Version(object):
         return ('major', 'minor', 'build', 'revision')
 
     def values(self):
-        return (self.major, self.minor, self.build, self.revision)
+        return self._values
 
     def items(self):
         return (
@@ -268,48 +844,243 @@ class Version(object):
                 return False
         return True
 
+    @staticmethod
+    def _parts(obj):
+        return (
+            obj.major or 0,
+            obj.minor or 0,
+            obj.build or 0,
+            obj.revision or 0,
+        )
+
     def __eq__(self, other):
+        if isinstance(other, Version):
+            if self._key is not None and other._key is not None:
+                return self._key == other._key
+            return self._parts(self) == self._parts(other)
+
         if self._hasattrs(other, 'major', 'minor', 'build', 'revision'):
-            return (
-                self.major or 0,
-                self.minor or 0,
-                self.build or 0,
-                self.revision or 0,
-            ) == (
-                other.major or 0,
-                other.minor or 0,
-                other.build or 0,
-                other.revision or 0,
-            )
+            return self._parts(self) == self._parts(other)
 
         return NotImplemented
 
     def __lt__(self, other):
+        if isinstance(other, Version):
+            if self._key is not None and other._key is not None:
+                return self._key < other._key
+            return self._parts(self) < self._parts(other)
+
         if self._hasattrs(other, 'major', 'minor', 'build', 'revision'):
-            return (
-                self.major or 0,
-                self.minor or 0,
-                self.build or 0,
-                self.revision or 0,
-            ) < (
-                other.major or 0,
-                other.minor or 0,
-                other.build or 0,
-                other.revision or 0,
-            )
+            return self._parts(self) < self._parts(other)
 
         return NotImplemented
 
+    __hash__ = None
+
     def pop(self, k, d=KeyError):
         raise NotImplementedError
 
 
+class FrozenVersion(Version):
+    """
+    Immutable, hashable `Version`, as returned by `Version.parse`.
+    """
+    __slots__ = ('_full',)
+
+    def _set_part(self, index, value):
+        raise TypeError('{} is immutable'.format(self.__class__.__name__))
+
+    def __setitem__(self, key, value):
+        raise TypeError('{} is immutable'.format(self.__class__.__name__))
+
+    def full(self):
+        try:
+            return self._full
+        except AttributeError:
+            self._full = super().full()
+            return self._full
+
+    def __hash__(self):
+        if self._key is not None:
+            return hash(self._key)
+        return hash(self._parts(self))
+
+
+@lru_cache(maxsize=65536, typed=True)
+def _parse_version(version):
+    return FrozenVersion(version)
+
+
+def sort_versions(items, key=None, reverse=False):
+    """
+    Sort `items` in place by version, like `list.sort`.
+    `key` returns the version, as a string or `Version`, of an item.
+    """
+    versions = [Version.parse(key(item) if key is not None else item) for item in items]
+
+    sort_keys = [version.sort_key for version in versions]
+    if None in sort_keys:
+        sort_keys = versions
+
+    order = sorted(range(len(items)), key=sort_keys.__getitem__, reverse=reverse)
+    items[:] = [items[i] for i in order]
+
+
 ####################
 
 
-def build_plugin(path, output=None, build_cfg=None, version=None, dotnet_config='Release', dotnet_framework=None, max_cpu_count=None):
+class BuildTimings(object):
+    """
+    Wall clock time, and CPU time where known, of each phase of building and packaging a plugin.
+
+        timings = BuildTimings()
+        with timings.phase('zip'):
+            ...
+    """
+
+    def __init__(self):
+        self.phases = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Time the body of the `with` block as phase `name`.
+        The yielded record can be given the `cpu` time of the commands run in the phase.
+        """
+        record = {'phase': name, 'wall': None, 'cpu': None}
+        start = time.monotonic()
+        try:
+            yield record
+        finally:
+            record['wall'] = time.monotonic() - start
+            self.phases.append(record)
+
+    @property
+    def total(self):
+        return sum(record['wall'] for record in self.phases)
+
+    def table(self):
+        rows = [
+            [record['phase'], '{:.3f}'.format(record['wall']), '' if record['cpu'] is None else '{:.3f}'.format(record['cpu'])]
+            for record in self.phases
+        ]
+        rows.append(['total', '{:.3f}'.format(self.total), ''])
+        return tabulate.tabulate(rows, headers=('PHASE', 'WALL (s)', 'CPU (s)'), tablefmt='plain')
+
+    def as_dict(self, **info):
+        return dict(info, total=self.total, phases=list(self.phases))
+
+
+def _normalize_project(data):
+    # The version is rewritten on every build, and does not affect what is restored
+    data = _project_version_re.sub('', data)
+    data = _project_file_version_re.sub('', data)
+    return _project_assembly_version_re.sub('', data)
+
+
+def build_fingerprint(path, projects, settings=None):
+    """
+    Fingerprint of the inputs of a build of the plugin at `path`, for `build_plugin` to tell which phases can be skipped.
+
+    `restore` holds SHA-256 digests of the project files and `Directory.Build.props` (ignoring their version)
+    and of the files in `RESTORE_INPUT_FILES` next to them, `sources` the size and mtime of every other file
+    in the project directories, outside of `bin`, `obj` and `artifacts`.
+    """
+    restore = {}
+    project_dirs = set()
+    for project in projects:
+        with open(project, 'r') as fh:
+            data = _normalize_project(fh.read())
+        if project.endswith('proj'):
+            project_dirs.add(os.path.abspath(os.path.dirname(project)))
+        restore[os.path.relpath(project, path)] = hashlib.sha256(data.encode()).hexdigest()
+
+    for project_dir in sorted(project_dirs | {os.path.abspath(path)}):
+        for fn in os.listdir(project_dir):
+            if fn in RESTORE_INPUT_FILES or fn.endswith('.sln'):
+                restore.setdefault(os.path.relpath(os.path.join(project_dir, fn), path),
+                                   checksum_file(os.path.join(project_dir, fn), checksum_type='sha256'))
+
+    sources = {}
+    for project_dir in sorted(project_dirs):
+        for root, dirs, files in os.walk(project_dir, topdown=True):
+            dirs[:] = [d for d in dirs if d not in ('bin', 'obj', 'artifacts') and not d.startswith('.')]
+            for fn in files:
+                fp = os.path.join(root, fn)
+                rp = os.path.relpath(fp, path)
+                if rp not in restore:
+                    st = os.stat(fp)
+                    sources[rp] = [st.st_size, st.st_mtime_ns]
+
+    return {
+        'settings': settings or {},
+        'restore': restore,
+        'sources': sources,
+    }
+
+
+def _fingerprint_change(old, new, *parts):
+    """
+    Describe the first difference between two build fingerprints in `parts`, or None if they are the same.
+    """
+    if old is None:
+        return 'no previous build'
+
+    for part in parts:
+        old_part = old.get(part, {})
+        new_part = new[part]
+        if part == 'settings':
+            for key in sorted(set(old_part) | set(new_part)):
+                if old_part.get(key) != new_part.get(key):
+                    return '{} changed from `{}` to `{}`'.format(key, old_part.get(key), new_part.get(key))
+            continue
+
+        for name in sorted(set(old_part) | set(new_part)):
+            if name not in old_part:
+                return '`{}` added'.format(name)
+            if name not in new_part:
+                return '`{}` removed'.format(name)
+            if old_part[name] != new_part[name]:
+                return '`{}` changed'.format(name)
+
+    return None
+
+
+def read_build_state(path):
+    try:
+        with open(os.path.join(path, BUILD_STATE_FILE), 'r') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def write_build_state(path, state):
+    state_file = os.path.join(path, BUILD_STATE_FILE)
+    os.makedirs(os.path.dirname(state_file), exist_ok=True)
+    _write_atomic(state_file, json.dumps(state, indent=4, sort_keys=True).encode())
+
+
+def build_plugin(path, output=None, build_cfg=None, version=None, dotnet_config='Release', dotnet_framework=None, max_cpu_count=None,
+                 incremental=False, timings=None, jobs=None):
+    """
+    Build the plugin at `path` with `dotnet publish` into `output`.
+
+    With `incremental`, `dotnet clean` is skipped when none of the build inputs changed since the
+    last successful build, and `dotnet restore` is skipped when none of the restore inputs changed,
+    or allowed to use the NuGet cache when they did (see `build_fingerprint`). Without a previous
+    build, or without `incremental`, every build is a clean build with a cold restore.
+
+    Returns a dict of the reason each phase ran, or None for skipped phases.
+    This is also recorded with the fingerprint in `BUILD_STATE_FILE`.
+    The time each phase takes is added to `timings`, a `BuildTimings`.
+    `jobs` is the number of threads used to rewrite the project files (number of CPUs).
+    """
+    if timings is None:
+        timings = BuildTimings()
+
     if build_cfg is None:
-        build_cfg = get_config(path)
+        with timings.phase('config'):
+            build_cfg = get_config(path)
 
         if build_cfg is None:
             return None
@@ -362,40 +1133,90 @@ def build_plugin(path, output=None, build_cfg=None, version=None, dotnet_config=
     if os.path.exists(dbp_file):
         projects.append(dbp_file)
 
-    for project in projects:
-        set_project_version(project, version=version)
-        set_project_framework(project, framework=dotnet_framework)
-
-    clean_command = "dotnet clean --configuration={dotnet_config} --framework={dotnet_framework}"
-    stdout, stderr, retcode = run_os_command(clean_command.format(**params), cwd=path)
-    if retcode:
-        logger.info(stdout)
-        logger.error(stderr)
-        exit(1)
+    with timings.phase('rewrite'):
+        rewrite_projects(projects, version=version, framework=dotnet_framework, jobs=jobs)
 
+    phases = {
+        'clean': 'incremental build disabled',
+        'restore': 'incremental build disabled',
+        'publish': 'always',
+    }
     restore_command = "dotnet restore --no-cache"
-    stdout, stderr, retcode = run_os_command(restore_command.format(**params), cwd=path)
-    if retcode:
-        logger.info(stdout)
-        logger.error(stderr)
-        exit(1)
+
+    fingerprint = None
+    if incremental:
+        with timings.phase('fingerprint'):
+            fingerprint = build_fingerprint(path, projects, settings={
+                'dotnet_config': dotnet_config,
+                'dotnet_framework': dotnet_framework,
+            })
+            previous = (read_build_state(path) or {}).get('fingerprint')
+
+        phases['clean'] = _fingerprint_change(previous, fingerprint, 'settings', 'restore', 'sources')
+        phases['restore'] = _fingerprint_change(previous, fingerprint, 'restore')
+        if phases['restore'] is None:
+            for project in projects:
+                assets_file = os.path.join(os.path.dirname(project), 'obj', 'project.assets.json')
+                if project.endswith('proj') and not os.path.exists(assets_file):
+                    phases['restore'] = '`{}` missing'.format(os.path.relpath(assets_file, path))
+                    break
+
+        if previous is not None:
+            # The packages in the NuGet cache are immutable, a changed dependency graph can use them.
+            restore_command = "dotnet restore"
+
+    for phase, reason in phases.items():
+        if reason is None:
+            logger.info("Skipping dotnet {}: inputs unchanged since the last build".format(phase))
+        else:
+            logger.info("Running dotnet {}: {}".format(phase, reason))
+
+    def run_phase(phase, command, log_level=logging.DEBUG):
+        with timings.phase(phase) as record:
+            result = run_command_streaming(command.format(**params), cwd=path, log_level=log_level)
+            record['cpu'] = result.cpu_time
+        if result.returncode:
+            logger.error(result.output)
+            exit(1)
+        return result
+
+    if phases['clean'] is not None:
+        run_phase('clean', "dotnet clean --configuration={dotnet_config} --framework={dotnet_framework}")
+
+    if phases['restore'] is not None:
+        run_phase('restore', restore_command)
 
     build_command = "dotnet publish --nologo --no-restore" \
         " --configuration={dotnet_config} --framework={dotnet_framework}" \
         " -p:PublishDir={output} -p:Version={version} -maxcpucount:{max_cpu_count}"
 
-    stdout, stderr, retcode = run_os_command(build_command.format(**params), cwd=path)
-    if retcode:
-        logger.info(stdout)
-        logger.error(stderr)
-        exit(1)
+    run_phase('publish', build_command, log_level=logging.INFO)
+
+    if fingerprint is not None:
+        write_build_state(path, {'fingerprint': fingerprint, 'phases': phases})
+
+    return phases
+
+
+def package_plugin(path, build_cfg=None, version=None, binary_path=None, output=None, bundle=False, reproducible=None,
+                   compresslevel=None, timings=None, jobs=None):
+    """
+    Package the built plugin into `<output>/<slug>_<version>.zip`, with `.meta.json` and `.md5sum` sidecars.
 
-    logger.info(stdout)
+    With `reproducible` (default when `SOURCE_DATE_EPOCH` is set) the zip is the same byte for byte
+    for the same inputs, timestamped with `get_source_date_epoch`, and is not rewritten if it
+    already exists with the same contents.
 
+    `compresslevel` is the zlib compression level of the zip entries, 0-9,
+    and `jobs` the number of threads compressing them (number of CPUs).
+    The time each phase takes is added to `timings`, a `BuildTimings`.
+    """
+    if timings is None:
+        timings = BuildTimings()
 
-def package_plugin(path, build_cfg=None, version=None, binary_path=None, output=None, bundle=False):
     if build_cfg is None:
-        build_cfg = get_config(path)
+        with timings.phase('config'):
+            build_cfg = get_config(path)
 
         if build_cfg is None:
             return None
@@ -431,54 +1252,226 @@ def package_plugin(path, build_cfg=None, version=None, binary_path=None, output=
     output_file = "{slug}_{version}.zip".format(slug=slug, version=version)
     output_path = os.path.join(output, output_file)
 
-    with tempfile.TemporaryDirectory() as tempdir:
+    if reproducible is None:
+        reproducible = bool(os.environ.get('SOURCE_DATE_EPOCH'))
+
+    build_date = None
+    date_time = None
+    if reproducible:
+        epoch = get_source_date_epoch(path)
+        build_date = datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        date_time = time.gmtime(epoch)[:6]
+
+    # Artifacts are zipped straight from the publish directory, and the metadata from memory.
+    with timings.phase('stage'):
+        entries = []
+        dirs = set()
         for artifact in build_cfg['artifacts']:
             artifact_path = os.path.join(binary_path, artifact)
-            artifact_temp_path = os.path.join(tempdir, artifact)
+            if not os.path.isfile(artifact_path):
+                logger.error("Artifact `{}` not found at `{}`.".format(artifact, artifact_path))
+                exit(1)
 
-            artifact_temp_dir = os.path.dirname(artifact_temp_path)
-            if not os.path.exists(artifact_temp_dir):
-                os.makedirs(artifact_temp_dir)
+            entries.append((os.path.normpath(artifact), artifact_path))
 
-            shutil.copyfile(artifact_path, artifact_temp_path)
+            artifact_dir = os.path.dirname(os.path.normpath(artifact))
+            while artifact_dir and artifact_dir not in dirs:
+                dirs.add(artifact_dir)
+                entries.append((artifact_dir, os.path.join(binary_path, artifact_dir)))
+                artifact_dir = os.path.dirname(artifact_dir)
 
         if image_path is not None:
             image_name = os.path.basename(image_path)
-            image_temp_path = os.path.join(tempdir, image_name)
-            shutil.copyfile(image_path, image_temp_path)
+            entries.append((image_name, image_path))
 
             build_cfg['image'] = image_name
 
-        meta = generate_metadata(build_cfg, version=version)
-        meta_tempfile = os.path.join(tempdir, JSON_METADATA_FILE)
-        with open(meta_tempfile, 'w') as fh:
-            json.dump(meta, fh, sort_keys=True, indent=4)
+    with timings.phase('metadata'):
+        meta = generate_metadata(build_cfg, version=version, build_date=build_date)
+        meta_data = json.dumps(meta, sort_keys=True, indent=4).encode()
+        entries.append((JSON_METADATA_FILE, meta_data))
 
-        try:
-            zip_path(output_path, tempdir)
-        except FileNotFoundError as e:
-            logger.error(e)
-            exit(1)
+    entries.sort()
+
+    md5 = None
+    try:
+        with timings.phase('zip'):
+            if reproducible:
+                fingerprint = zip_fingerprint(entries, date_time, compresslevel)
+                if read_zip_fingerprint(output_path) == fingerprint:
+                    logger.info("`{}` is up to date.".format(output_path))
+                    md5 = read_checksum_file(output_path)
+                else:
+                    zip_entries(output_path, entries, date_time=date_time, compresslevel=compresslevel, jobs=jobs,
+                                comment=ZIP_FINGERPRINT_PREFIX + fingerprint.encode())
+            else:
+                zip_entries(output_path, entries, compresslevel=compresslevel, jobs=jobs)
+    except FileNotFoundError as e:
+        logger.error(e)
+        exit(1)
 
-        md5 = checksum_file(output_path, checksum_type='md5')
+    with timings.phase('checksum'):
+        if md5 is None:
+            md5 = checksum_file(output_path, checksum_type='md5')
 
-        with open(output_path + '.md5sum', 'wb') as fh:
-            fh.write(md5.encode())
-            fh.write(b' *')
-            fh.write(output_file.encode())
-            fh.write(b'\n')
+        _write_atomic(output_path + '.md5sum', b''.join((md5.encode(), b' *', output_file.encode(), b'\n')))
 
-        shutil.move(meta_tempfile, '{filename}.{meta}'.format(filename=output_path, meta=JSON_METADATA_FILE))
+    _write_atomic('{filename}.{meta}'.format(filename=output_path, meta=JSON_METADATA_FILE), meta_data)
 
     return output_path
 
 
-def generate_metadata(build_cfg, version=None, build_date=None):
+def find_plugin_dirs(root):
+    """
+    Directories below `root` with a plugin build config in one of `CONFIG_LOCATIONS`, in sorted order.
+    Plugins are not looked for inside of other plugins.
+    """
+    plugin_dirs = []
+    for dirpath, dirs, files in os.walk(root, topdown=True):
+        if find_config_files(dirpath):
+            build_cfg = get_config(dirpath)
+            if isinstance(build_cfg, dict) and 'guid' in build_cfg:
+                plugin_dirs.append(dirpath)
+                dirs[:] = []
+                continue
 
-    if version is None:
-        version = build_cfg['version']
+        dirs[:] = sorted(d for d in dirs if d not in ('bin', 'obj', 'artifacts', 'node_modules') and not d.startswith('.'))
 
-    if version is not None:
+    return sorted(plugin_dirs)
+
+
+class PluginBuildJob(object):
+    """
+    Build and package one plugin for one framework, recording the outcome instead of exiting on failure.
+    """
+
+    def __init__(self, path, build_cfg, framework, output, dotnet_config='Release', max_cpu_count=1,
+                 incremental=False, reproducible=None, compresslevel=None):
+        self.path = path
+        self.build_cfg = build_cfg
+        self.framework = framework
+        self.output = output
+        self.dotnet_config = dotnet_config
+        self.max_cpu_count = max_cpu_count
+        self.incremental = incremental
+        self.reproducible = reproducible
+        self.compresslevel = compresslevel
+
+        self.status = 'pending'
+        self.artifact = None
+        self.duration = None
+        self.error = None
+        self.timings = BuildTimings()
+
+    def run(self):
+        logger.info("Building {} for {}".format(self.build_cfg['name'], self.framework))
+        start = time.monotonic()
+        # package_plugin fills in the config, and a plugin may be built for several frameworks.
+        build_cfg = copy.deepcopy(self.build_cfg)
+        try:
+            os.makedirs(self.output, exist_ok=True)
+            with tempfile.TemporaryDirectory() as bintemp:
+                build_plugin(self.path, output=bintemp, build_cfg=build_cfg, dotnet_config=self.dotnet_config,
+                             dotnet_framework=self.framework, max_cpu_count=self.max_cpu_count,
+                             incremental=self.incremental, timings=self.timings, jobs=self.max_cpu_count)
+                self.artifact = package_plugin(self.path, build_cfg=build_cfg, binary_path=bintemp, output=self.output,
+                                               reproducible=self.reproducible, compresslevel=self.compresslevel,
+                                               timings=self.timings, jobs=self.max_cpu_count)
+            self.status = 'ok'
+        except SystemExit as e:
+            # build_plugin and package_plugin exit on errors they have already logged
+            self.status = 'failed'
+            self.error = 'exit status {}'.format(e.code)
+        except Exception as e:
+            logger.exception("Building {} for {} failed".format(self.build_cfg['name'], self.framework))
+            self.status = 'failed'
+            self.error = str(e)
+        finally:
+            self.duration = time.monotonic() - start
+
+        return self
+
+    def timings_dict(self):
+        return self.timings.as_dict(
+            plugin=self.build_cfg['name'],
+            path=self.path,
+            framework=self.framework,
+            status=self.status,
+            artifact=self.artifact,
+        )
+
+
+def plan_plugin_builds(root, output, frameworks=None, **kwargs):
+    """
+    Expand every plugin below `root` into one `PluginBuildJob` per target framework.
+
+    Frameworks come from `frameworks`, or else the `framework` of each plugin config,
+    which may be a list. Plugins built for several frameworks get a subdirectory of `output` per framework.
+    Returns a list of job lists, one per plugin.
+    """
+    plans = []
+    for path in find_plugin_dirs(root):
+        build_cfg = get_config(path)
+        plugin_frameworks = list(frameworks or [])
+        if not plugin_frameworks:
+            plugin_frameworks = build_cfg.get('framework', DEFAULT_FRAMEWORK)
+            if isinstance(plugin_frameworks, str):
+                plugin_frameworks = [plugin_frameworks]
+
+        plans.append([
+            PluginBuildJob(
+                path,
+                build_cfg,
+                framework,
+                output if len(plugin_frameworks) == 1 else os.path.join(output, framework),
+                **kwargs,
+            )
+            for framework in plugin_frameworks
+        ])
+
+    return plans
+
+
+def run_plugin_builds(plans, jobs=None, cpu_budget=None):
+    """
+    Run the jobs of `plan_plugin_builds` within a budget of `cpu_budget` cores (number of CPUs).
+
+    Up to `jobs` plugins are built at once, and the budget is split evenly between them as
+    `-maxcpucount`, and the threads each uses to rewrite projects and compress its zip. By default, as many plugins as there are cores are built at once,
+    since most of a build is spent in single threaded steps.
+    The frameworks of a plugin are built one after another, as the build rewrites the project files.
+    """
+    if cpu_budget is None:
+        cpu_budget = os.cpu_count() or 1
+
+    if jobs is None:
+        jobs = cpu_budget
+    jobs = max(1, min(jobs, len(plans)))
+    max_cpu_count = max(1, cpu_budget // jobs)
+    logger.info("Building {} plugin(s), {} at a time with {} core(s) each".format(len(plans), jobs, max_cpu_count))
+
+    def run_plan(plan):
+        for job in plan:
+            job.max_cpu_count = max_cpu_count
+            job.run()
+        return plan
+
+    if jobs > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            list(executor.map(run_plan, plans))
+    else:
+        for plan in plans:
+            run_plan(plan)
+
+    return [job for plan in plans for job in plan]
+
+
+def generate_metadata(build_cfg, version=None, build_date=None):
+
+    if version is None:
+        version = build_cfg['version']
+
+    if version is not None:
         version = Version(version).full()
 
     if build_date is None:
@@ -519,34 +1512,75 @@ def generate_metadata(build_cfg, version=None, build_date=None):
     return meta
 
 
-def generate_plugin_manifest(filename, repo_url='', plugin_url=None, meta=None, md5=None):
-    if meta is None:
-        meta_filename = '{filename}.{meta}'.format(filename=filename, meta=JSON_METADATA_FILE)
-        if os.path.exists(meta_filename):
-            with open(meta_filename) as fh:
-                meta = json.load(fh)
-                logger.info("Read meta from `{}`".format(meta_filename))
-                logger.debug(meta)
+def read_plugin_meta(filename, zf=None):
+    """
+    Read the plugin metadata from the `.meta.json` sidecar, or from the archive itself.
+    An already open `zipfile.ZipFile` of the archive can be passed as `zf` to avoid reopening it.
+    """
+    meta_filename = '{filename}.{meta}'.format(filename=filename, meta=JSON_METADATA_FILE)
+    if os.path.exists(meta_filename):
+        with open(meta_filename) as fh:
+            meta = json.load(fh)
+            logger.info("Read meta from `{}`".format(meta_filename))
+            logger.debug(meta)
+            return meta
+
+    if zf is None:
+        with zipfile.ZipFile(filename, 'r') as zf:
+            return read_plugin_meta(filename, zf=zf)
+
+    if JSON_METADATA_FILE in zf.namelist():
+        with zf.open(JSON_METADATA_FILE, 'r') as fh:
+            meta = json.load(fh)
+            logger.info("Read meta from `{}:{}`".format(filename, JSON_METADATA_FILE))
+            logger.debug(meta)
+            return meta
+
+    return None
+
+
+def read_checksum_file(filename, checksum_type='md5'):
+    """
+    Read the checksum of `filename` from a `.md5sum` style sidecar, as written by `package_plugin`.
+    Returns None if there is no usable sidecar, or if it is older than the file it describes.
+    """
+    sidecar = '{filename}.{type}sum'.format(filename=filename, type=checksum_type)
+    try:
+        if os.stat(sidecar).st_mtime_ns < os.stat(filename).st_mtime_ns:
+            logger.info("Ignoring `{}`, it is older than the file it describes.".format(sidecar))
+            return None
+
+        with open(sidecar, 'r') as fh:
+            line = fh.readline()
+    except FileNotFoundError:
+        return None
+
+    parts = line.split(None, 1)
+    if len(parts) != 2 or parts[1].strip().lstrip('*') != os.path.basename(filename):
+        logger.warning("Ignoring `{}`, it does not describe `{}`.".format(sidecar, filename))
+        return None
+
+    logger.info("Read {} checksum from `{}`".format(checksum_type, sidecar))
+    return parts[0].lower()
 
+
+def generate_plugin_manifest(filename, repo_url='', plugin_url=None, meta=None, md5=None, checksums=None):
     if meta is None:
-        with zipfile.ZipFile(filename, 'r') as zf:
-            if JSON_METADATA_FILE in zf.namelist():
-                with zf.open(JSON_METADATA_FILE, 'r') as fh:
-                    meta = json.load(fh)
-                    logger.info("Read meta from `{}:{}`".format(filename, JSON_METADATA_FILE))
-                    logger.debug(meta)
+        meta = read_plugin_meta(filename)
 
     if meta is None:
         raise ValueError('Metadata not provided')
 
-    # TODO: Read .md5sum file
+    if md5 is None:
+        md5 = read_checksum_file(filename)
+
     if md5 is None:
         md5 = checksum_file(filename)
 
     if not repo_url and not plugin_url:
         logger.warning("repo and plugin url not provided, provide at least one.")
 
-    slug = slugify(meta['name'])
+    slug = plugin_slug(meta['name'])
 
     source_url = "{url}/{slug}/{slug}_{version}.zip".format(
         url=repo_url.rstrip('/'),
@@ -575,6 +1609,11 @@ def generate_plugin_manifest(filename, repo_url='', plugin_url=None, meta=None,
         }]
     }
 
+    # Additional checksums, alongside the MD5 Jellyfin uses
+    extra_checksums = {k: v for k, v in (checksums or {}).items() if k != 'md5'}
+    if extra_checksums:
+        manifest['versions'][0]['checksums'] = extra_checksums
+
     if "imageUrl" in meta:
         manifest['imageUrl'] = meta['imageUrl']
 
@@ -600,48 +1639,727 @@ def update_plugin_manifest(old, new):
     new_versions = new.pop('versions')
     old_versions = old.pop('versions')
 
-    new_version_numbers = [x['version'] for x in new_versions]
+    new_version_numbers = {x['version'] for x in new_versions}
 
     old.update(new)
 
-    old['versions'] = []
-
-    while old_versions:
-        ver = old_versions.pop(0)
-
+    versions = []
+    for ver in old_versions:
         # Upgrade old incomplete version numbers - Jellyfin is not a fan of those.
-        ver['version'] = Version(ver['version']).full()
+        ver['version'] = Version.parse(ver['version']).full()
 
         if ver['version'] not in new_version_numbers:
-            old['versions'].append(ver)
+            versions.append(ver)
+
+    old['versions'] = versions
+
+    # Versions are kept newest first, so the new ones can usually be inserted in place,
+    # after any equal versions, which is where a stable sort would put them.
+    keys = [Version.parse(ver['version']).sort_key for ver in versions]
+    new_keys = [Version.parse(ver['version']).sort_key for ver in new_versions]
+
+    if None in keys or None in new_keys or any(a < b for a, b in zip(keys, keys[1:])):
+        versions.extend(new_versions)
+        sort_versions(versions, key=lambda release: release['version'], reverse=True)
+        return old
 
-    while new_versions:
-        ver = new_versions.pop(0)
-        old['versions'].append(ver)
+    # Negated, for bisect to work on an ascending list
+    keys = [-key for key in keys]
+    for ver, key in zip(new_versions, new_keys):
+        i = bisect.bisect_right(keys, -key)
+        keys.insert(i, -key)
+        versions.insert(i, ver)
 
-    old['versions'].sort(key=lambda l: Version(l['version']), reverse=True)
     return old
 
 
-def get_plugin_from_manifest(repo_manifest: dict, plugin: Union[str, uuid.UUID]) -> Optional[dict]:
-    if plugin is None:
-        return None
+def get_plugin_from_manifest(repo_manifest: Union[list, 'RepositoryIndex'], plugin: Union[str, uuid.UUID]) -> Optional[dict]:
+    if not isinstance(repo_manifest, RepositoryIndex):
+        repo_manifest = RepositoryIndex(repo_manifest)
 
-    if isinstance(plugin, uuid.UUID):
-        plugin = str(plugin)
-    else:
+    return repo_manifest.get(plugin)
+
+
+@lru_cache(maxsize=4096)
+def plugin_slug(name):
+    return slugify(name)
+
+
+def normalize_guid(guid):
+    if isinstance(guid, uuid.UUID):
+        return str(guid)
+
+    try:
+        return str(uuid.UUID(guid))
+    except (ValueError, TypeError, AttributeError):
+        return guid
+
+
+class RepositoryIndex(object):
+    """
+    Lookup tables over a repository manifest, mapping normalized GUID, exact name and slug
+    to the plugin entries of the manifest.
+
+    Plugins must be added, merged and removed through the index to keep it consistent
+    with the manifest list it wraps.
+    """
+
+    def __init__(self, manifest=None, storage=None):
+        self.manifest = manifest if manifest is not None else []
+        self.storage = storage
+
+        # Entries modified, and removed, since the repository was last saved
+        self.changed = set()
+        self.removed = []
+        # Amount of the journal applied on load
+        self.journal_offset = 0
+
+        self._order = {}
+        self._next_order = 0
+        self._by_guid = {}
+        self._by_name = {}
+        self._by_slug = {}
+
+        for entry in self.manifest:
+            self._index(entry)
+
+    def _keys(self, entry):
+        name = entry.get('name')
+        return (
+            (self._by_guid, normalize_guid(entry.get('guid'))),
+            (self._by_name, name),
+            (self._by_slug, plugin_slug(name) if name is not None else None),
+        )
+
+    def _index(self, entry):
+        if id(entry) not in self._order:
+            self._order[id(entry)] = self._next_order
+            self._next_order += 1
+
+        # Keep each list in manifest order, so entries re-indexed after a merge stay where they were
+        order = self._order[id(entry)]
+        for table, key in self._keys(entry):
+            if key is not None:
+                entries = table.setdefault(key, [])
+                if not entries or self._order[id(entries[-1])] < order:
+                    entries.append(entry)
+                else:
+                    entries.insert(bisect.bisect([self._order[id(e)] for e in entries], order), entry)
+
+    def _unindex(self, entry):
+        for table, key in self._keys(entry):
+            entries = table.get(key)
+            if not entries:
+                continue
+
+            entries[:] = [e for e in entries if e is not entry]
+            if not entries:
+                del table[key]
+
+    def __iter__(self):
+        return iter(self.manifest)
+
+    def __len__(self):
+        return len(self.manifest)
+
+    def get(self, plugin: Union[str, uuid.UUID, None]) -> Optional[dict]:
+        """
+        Find a plugin by GUID, name or slug.
+        If several plugins match, the one listed first in the manifest wins.
+        """
+        if plugin is None:
+            return None
+
+        plugin = normalize_guid(plugin)
+
+        candidates = []
+        for table in (self._by_guid, self._by_name, self._by_slug):
+            entries = table.get(plugin)
+            if entries:
+                candidates.append(entries[0])
+
+        if not candidates:
+            return None
+
+        return min(candidates, key=lambda entry: self._order[id(entry)])
+
+    def get_by_guid(self, guid: Union[str, uuid.UUID]) -> list:
+        return list(self._by_guid.get(normalize_guid(guid), []))
+
+    def add(self, entry):
+        self.manifest.append(entry)
+        self._index(entry)
+        self.changed.add(id(entry))
+
+    def remove(self, entry):
+        for i, e in enumerate(self.manifest):
+            if e is entry:
+                del self.manifest[i]
+                break
+        else:
+            raise ValueError(entry)
+
+        self._unindex(entry)
+        del self._order[id(entry)]
+        self.changed.discard(id(entry))
+        self.removed.append(entry)
+
+    def remove_version(self, entry, version: str) -> list:
+        """
+        Remove the releases of `version` (in full four-part form) from a plugin entry.
+        Returns the removed releases.
+        """
+        removed = [release for release in entry.get('versions', []) if release.get('version') == version]
+        if removed:
+            entry['versions'] = [release for release in entry['versions'] if release.get('version') != version]
+            self.changed.add(id(entry))
+
+        return removed
+
+    def merge(self, plugin_manifest):
+        """
+        Merge a plugin manifest, as returned by `generate_plugin_manifest`, into the repository.
+        Returns the repository entries that were updated, or added.
+        """
+        entries = self.get_by_guid(plugin_manifest['guid'])
+        if not entries:
+            self.add(plugin_manifest)
+            return [plugin_manifest]
+
+        for entry in entries:
+            self._unindex(entry)
+            update_plugin_manifest(entry, dict(plugin_manifest, versions=list(plugin_manifest['versions'])))
+            self._index(entry)
+            self.changed.add(id(entry))
+
+        return entries
+
+
+def get_repo_config(repo_path) -> dict:
+    """
+    Read the repository settings from `.jprm-repo.yaml` next to the repository manifest.
+    """
+    config_path = os.path.join(os.path.dirname(repo_path), REPO_CONFIG_FILE)
+    if not os.path.exists(config_path):
+        return {}
+
+    return load_manifest(config_path) or {}
+
+
+def _write_atomic(filename, data: bytes):
+    tmpfile = '{filename}.{tag}.tmp'.format(filename=filename, tag=uuid.uuid4().hex)
+    with open(tmpfile, 'wb') as fh:
+        logger.debug('Writing {}'.format(tmpfile))
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+    logger.debug('Renaming {} to {}'.format(tmpfile, filename))
+    os.replace(tmpfile, filename)
+
+
+# ioctl to share the extents of one file with another, on btrfs, XFS and other CoW file systems
+FICLONE = 0x40049409
+
+
+def _reflink(src, dst):
+    if fcntl is None or not sys.platform.startswith('linux'):
+        raise OSError(errno.EOPNOTSUPP, 'Reflinks are not supported on this platform')
+
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
         try:
-            plugin = str(uuid.UUID(plugin))
-        except ValueError:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.remove(dst)
+            raise
+
+
+def place_file(src, dst, placement='copy'):
+    """
+    Put a copy of the file `src` at `dst`, which must not exist, and return how: `reflink`, `hardlink` or `copy`.
+
+    `placement` is one of `REPO_PLACEMENTS`. With `reflink` the copy shares its data with `src`
+    until either is modified, with `hardlink` both names are the same file, and `auto` tries
+    a reflink, then a hardlink. Each falls back to a plain copy, e.g. across file systems.
+
+    A hardlinked file changes along with `src` if that is later rewritten in place,
+    rather than replaced.
+    """
+    if placement not in REPO_PLACEMENTS:
+        raise ValueError("Unknown placement `{}`".format(placement))
+
+    if placement in ('reflink', 'auto'):
+        try:
+            _reflink(src, dst)
+            return 'reflink'
+        except OSError as e:
+            logger.debug("Can not reflink `{}` to `{}`: {}".format(src, dst, e))
+
+    if placement in ('hardlink', 'auto'):
+        try:
+            os.link(src, dst)
+            return 'hardlink'
+        except OSError as e:
+            logger.debug("Can not hardlink `{}` to `{}`: {}".format(src, dst, e))
+
+    shutil.copyfile(src, dst)
+    return 'copy'
+
+
+class BlobStore(object):
+    """
+    Content addressed store of files in the repository, `.blobs/sha256/<xx>/<digest>`.
+
+    Files in the plugin directories are hardlinks to the blobs, so content shared by many plugins
+    and versions is stored once, and whether a file changed is a matter of comparing digests.
+    Where hardlinks are not supported, files are copied out of the store instead.
+    """
+
+    def __init__(self, repo_dir):
+        self.path = os.path.join(repo_dir, BLOB_STORE_DIR, 'sha256')
+
+    @classmethod
+    def for_repo(cls, repo_path):
+        """
+        The blob store of the repository at `repo_path`, or None if the `blobs` setting is `none`.
+        """
+        mode = get_repo_config(repo_path).get('blobs', 'none')
+        if mode not in REPO_BLOB_MODES:
+            raise ValueError("Unknown blob mode `{}`".format(mode))
+
+        if mode == 'none':
+            return None
+
+        return cls(os.path.dirname(repo_path))
+
+    def blob_path(self, digest):
+        return os.path.join(self.path, digest[:2], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self.blob_path(digest))
+
+    def add_bytes(self, digest, data: bytes):
+        blob = self.blob_path(digest)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            _write_atomic(blob, data)
+        return blob
+
+    def add_file(self, digest, filename):
+        """
+        Add the file `filename` with SHA-256 `digest` to the store, unless it is there already.
+        """
+        blob = self.blob_path(digest)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            tmpfile = '{blob}.{tag}.tmp'.format(blob=blob, tag=uuid.uuid4().hex)
+            place_file(filename, tmpfile, 'hardlink')
+            os.replace(tmpfile, blob)
+        return blob
+
+    def link(self, digest, target) -> bool:
+        """
+        Point `target` at the blob `digest`. Returns False if it already did.
+        """
+        blob = self.blob_path(digest)
+        try:
+            if os.path.samefile(blob, target):
+                return False
+        except FileNotFoundError:
             pass
 
-    items = [item for item in repo_manifest if plugin in [item.get('name'), item.get('guid'), slugify(item.get('name'))]]
-    if items:
-        return items[0]
+        tmpfile = '{target}.{tag}.tmp'.format(target=target, tag=uuid.uuid4().hex)
+        place_file(blob, tmpfile, 'hardlink')
+        os.replace(tmpfile, target)
+        return True
+
+
+class FileLock(object):
+    """
+    Advisory, exclusive lock between processes, held on a lock file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fh = None
+
+    def acquire(self, blocking=True) -> bool:
+        fh = open(self.path, 'a+b')
+        try:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            else:
+                fh.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError:
+                        if not blocking:
+                            raise BlockingIOError(self.path)
+                        time.sleep(0.1)
+        except BlockingIOError:
+            fh.close()
+            return False
+        except BaseException:
+            fh.close()
+            raise
+
+        self._fh = fh
+        return True
+
+    def release(self):
+        if self._fh is None:
+            return
+
+        if fcntl is not None:
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+        else:
+            self._fh.seek(0)
+            msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+        self._fh.close()
+        self._fh = None
+
+    def __enter__(self):
+        if not self.acquire(blocking=False):
+            logger.info("Waiting for lock on `{}`".format(self.path))
+            self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class ShardedManifest(object):
+    """
+    Repository layout where each plugin entry is kept in its own shard file, `<slug>/<guid>.json`,
+    and the shards are listed in manifest order in `<manifest>.shards`.
+
+    The public manifest is assembled from the serialized shards, so saving only re-encodes
+    the entries that changed. It is byte for byte what `json.dump(manifest, fh, indent=4)` writes.
+    """
+
+    def __init__(self, repo_path):
+        self.repo_path = repo_path
+        self.repo_dir = os.path.dirname(repo_path)
+        self.index_path = repo_path + '.shards'
+
+        self._paths = None
+        # id(entry) -> (shard path, shard bytes, indented manifest fragment)
+        self._encoded = {}
+
+    @staticmethod
+    def shard_path(entry):
+        return '{slug}/{guid}.json'.format(slug=plugin_slug(entry['name']), guid=normalize_guid(entry['guid']))
+
+    @staticmethod
+    def _fragment(data: bytes) -> bytes:
+        # JSON strings can not contain raw newlines, so indenting every line is safe.
+        return b'\n'.join(b'    ' + line for line in data.split(b'\n'))
+
+    def load(self) -> RepositoryIndex:
+        if not os.path.exists(self.index_path):
+            logger.info("No shard index at `{}`, reading `{}`.".format(self.index_path, self.repo_path))
+            with open(self.repo_path, 'r') as fh:
+                return RepositoryIndex(json.load(fh), storage=self)
+
+        with open(self.index_path, 'r') as fh:
+            logger.debug('Reading shard index from {}'.format(self.index_path))
+            self._paths = json.load(fh)
+
+        manifest = []
+        for path in self._paths:
+            with open(os.path.join(self.repo_dir, path), 'rb') as fh:
+                data = fh.read().rstrip()
+            entry = json.loads(data)
+            self._encoded[id(entry)] = (path, data, self._fragment(data))
+            manifest.append(entry)
+
+        return RepositoryIndex(manifest, storage=self)
+
+    def save(self, repository: RepositoryIndex):
+        paths = []
+        fragments = []
+        stale = set()
+
+        for entry in repository:
+            path = self.shard_path(entry)
+            encoded = self._encoded.get(id(entry))
+
+            if encoded is None or encoded[0] != path or id(entry) in repository.changed:
+                data = json.dumps(entry, indent=4).encode()
+                if encoded is None or encoded[:2] != (path, data):
+                    shard_file = os.path.join(self.repo_dir, path)
+                    os.makedirs(os.path.dirname(shard_file), exist_ok=True)
+                    _write_atomic(shard_file, data)
+                if encoded is not None and encoded[0] != path:
+                    stale.add(encoded[0])
+
+                encoded = (path, data, self._fragment(data))
+                self._encoded[id(entry)] = encoded
+
+            paths.append(path)
+            fragments.append(encoded[2])
+
+        for entry in repository.removed:
+            encoded = self._encoded.pop(id(entry), None)
+            stale.add(encoded[0] if encoded is not None else self.shard_path(entry))
+
+        if paths != self._paths:
+            _write_atomic(self.index_path, json.dumps(paths, indent=4).encode())
+            self._paths = paths
+
+        if fragments:
+            _write_atomic(self.repo_path, b'[\n' + b',\n'.join(fragments) + b'\n]')
+        else:
+            _write_atomic(self.repo_path, b'[]')
+
+        for path in stale.difference(paths):
+            logger.debug('Removing stale shard {}'.format(path))
+            try:
+                os.remove(os.path.join(self.repo_dir, path))
+            except FileNotFoundError:
+                pass
+
+        repository.changed.clear()
+        repository.removed.clear()
+
+
+def get_repo_storage(repo_path) -> Optional[ShardedManifest]:
+    """
+    Returns the storage backend for the configured repository layout, or None for a plain manifest file.
+    """
+    layout = get_repo_config(repo_path).get('layout', 'single')
+    if layout not in REPO_LAYOUTS:
+        raise ValueError("Unknown repository layout `{}`".format(layout))
+
+    if layout == 'sharded':
+        return ShardedManifest(repo_path)
 
     return None
 
 
+class RepositoryJournal(object):
+    """
+    Append-only log of repository operations, stored as JSON lines in `<manifest>.journal`.
+
+    Operations are dicts with an `op` of `add` (with the `plugin` manifest to merge),
+    `remove` (with the `plugin` GUID) or `remove_version` (with the `plugin` GUID and `version`).
+    Applying an operation twice has the same result as applying it once, so a crash between
+    writing the manifest and truncating the journal is harmless.
+    """
+
+    def __init__(self, repo_path):
+        self.path = repo_path + '.journal'
+        # Held while appending and truncating; readers only consume complete lines.
+        self.lock = FileLock(self.path + '.lock')
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def append(self, operations):
+        data = b''.join(
+            json.dumps(dict(operation, time=time.time()), sort_keys=True).encode() + b'\n'
+            for operation in operations
+        )
+
+        with self.lock, open(self.path, 'ab') as fh:
+            if fh.tell() and not self._ends_with_newline():
+                # Terminate a line torn by an earlier crash, it is skipped on read.
+                data = b'\n' + data
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        logger.debug('Appended {} operation(s) to {}'.format(len(operations), self.path))
+
+    def _ends_with_newline(self):
+        with open(self.path, 'rb') as fh:
+            fh.seek(-1, os.SEEK_END)
+            return fh.read(1) == b'\n'
+
+    def read(self):
+        """
+        Returns the complete operations in the journal, and the offset up to which it was read.
+        """
+        try:
+            with open(self.path, 'rb') as fh:
+                data = fh.read()
+        except FileNotFoundError:
+            return [], 0
+
+        offset = data.rfind(b'\n') + 1
+        operations = []
+        for line in data[:offset].splitlines():
+            if not line.strip():
+                continue
+            try:
+                operations.append(json.loads(line))
+            except ValueError:
+                logger.warning('Skipping corrupt line in {}: {!r}'.format(self.path, line[:80]))
+
+        return operations, offset
+
+    def truncate(self, offset):
+        """
+        Drop the first `offset` bytes of the journal, keeping anything appended after they were read.
+        Must be called with the repository lock held, so that only appends happen in between.
+        """
+        with self.lock:
+            try:
+                with open(self.path, 'rb') as fh:
+                    fh.seek(offset)
+                    remaining = fh.read()
+            except FileNotFoundError:
+                return
+
+            if remaining:
+                _write_atomic(self.path, remaining)
+            else:
+                logger.debug('Removing {}'.format(self.path))
+                os.remove(self.path)
+
+    def needs_compaction(self, max_size=None, max_age=None):
+        try:
+            size = os.stat(self.path).st_size
+        except FileNotFoundError:
+            return False
+
+        if max_size is not None and size >= max_size:
+            return True
+
+        if max_age is not None and size:
+            with open(self.path, 'rb') as fh:
+                try:
+                    first = json.loads(fh.readline())
+                except ValueError:
+                    return True
+            if time.time() - first.get('time', 0) >= max_age:
+                return True
+
+        return False
+
+    @staticmethod
+    def apply(repository: RepositoryIndex, operations):
+        for operation in operations:
+            op = operation.get('op')
+            if op == 'add':
+                repository.merge(operation['plugin'])
+            elif op == 'remove':
+                for entry in repository.get_by_guid(operation['plugin']):
+                    repository.remove(entry)
+            elif op == 'remove_version':
+                for entry in repository.get_by_guid(operation['plugin']):
+                    repository.remove_version(entry, operation['version'])
+            else:
+                raise ValueError('Unknown journal operation `{}`'.format(op))
+
+
+def load_repository(repo_path) -> RepositoryIndex:
+    """
+    Load a repository, with any operations in its journal applied.
+    """
+    storage = get_repo_storage(repo_path)
+    if storage is not None:
+        repository = storage.load()
+    else:
+        with open(repo_path, 'r') as fh:
+            logger.debug('Reading repo manifest from {}'.format(repo_path))
+            repository = RepositoryIndex(json.load(fh))
+
+    journal = RepositoryJournal(repo_path)
+    if journal.exists():
+        operations, repository.journal_offset = journal.read()
+        logger.debug('Applying {} operation(s) from {}'.format(len(operations), journal.path))
+        RepositoryJournal.apply(repository, operations)
+
+    return repository
+
+
+def save_repository(repo_path, repository: RepositoryIndex):
+    """
+    Write out a repository, folding the journal operations it was loaded with into the manifest.
+    """
+    if repository.storage is not None:
+        repository.storage.save(repository)
+    else:
+        _write_atomic(repo_path, json.dumps(repository.manifest, indent=4).encode())
+        repository.changed.clear()
+        repository.removed.clear()
+
+    if repository.journal_offset:
+        RepositoryJournal(repo_path).truncate(repository.journal_offset)
+        repository.journal_offset = 0
+
+
+def repository_lock(repo_path) -> FileLock:
+    """
+    Lock to hold across reading, modifying and writing the repository at `repo_path`.
+    """
+    return FileLock(repo_path + '.lock')
+
+
+def compact_repository(repo_path, blocking=True) -> bool:
+    """
+    Fold the journal into the manifest.
+    Returns False if not `blocking` and another process is writing the repository.
+    """
+    lock = repository_lock(repo_path)
+    if not lock.acquire(blocking=blocking):
+        logger.info("`{}` is being written by another process.".format(repo_path))
+        return False
+
+    try:
+        repository = load_repository(repo_path)
+        if repository.journal_offset:
+            logger.info('Compacting journal into {}'.format(repo_path))
+            save_repository(repo_path, repository)
+        else:
+            logger.info("Nothing to compact in `{}`.".format(repo_path))
+    finally:
+        lock.release()
+
+    return True
+
+
+def commit_repository_operations(repo_path, operations, coalesce=None):
+    """
+    Apply journal style operations to the repository at `repo_path`.
+
+    With `journal` enabled in the repository settings, the operations are only appended to the
+    journal, and the journal is compacted into the manifest once it grows larger than
+    `journal_max_size` bytes or older than `journal_max_age` seconds.
+
+    With `coalesce` (or `coalesce` in the repository settings), the operations are appended to
+    the journal before waiting for the repository lock, and whichever writer holds the lock
+    folds in everything queued up to that point. A burst of concurrent writers results in a
+    few manifest writes, instead of one each.
+
+    Otherwise, the repository is locked, loaded, modified and written out.
+    """
+    repo_config = get_repo_config(repo_path)
+    if coalesce is None:
+        coalesce = repo_config.get('coalesce', False)
+
+    if coalesce or repo_config.get('journal', False):
+        journal = RepositoryJournal(repo_path)
+        journal.append(operations)
+
+        if coalesce:
+            compact_repository(repo_path)
+        elif journal.needs_compaction(
+            max_size=repo_config.get('journal_max_size', 1_048_576),
+            max_age=repo_config.get('journal_max_age', 3600),
+        ):
+            # If someone else holds the lock, they or the next writer will compact.
+            compact_repository(repo_path, blocking=False)
+        return
+
+    with repository_lock(repo_path):
+        repository = load_repository(repo_path)
+        RepositoryJournal.apply(repository, operations)
+        save_repository(repo_path, repository)
+
+
 _project_version_re = re.compile(r'\<Version\>(?P<version>.*?)\</Version\>')
 _project_file_version_re = re.compile(r'\<FileVersion\>(?P<version>.*?)\</FileVersion\>')
 _project_assembly_version_re = re.compile(r'\<AssemblyVersion\>(?P<version>.*?)\</AssemblyVersion\>')
@@ -650,75 +2368,107 @@ _project_file_version_pattern = '<FileVersion>{version}</FileVersion>'
 _project_assembly_version_pattern = '<AssemblyVersion>{version}</AssemblyVersion>'
 
 
-def set_project_version(project_file, version):
-    version = Version(version)
-    logger.info("Setting project version to {}".format(version.full()))
+_project_framework_re = re.compile(r'\<TargetFramework\>(?P<framework>.*?)\</TargetFramework\>')
+_project_framework_pattern = '<TargetFramework>{framework}</TargetFramework>'
+
+_project_tags = (
+    # (name, value, regex, pattern)
+    ('version', 'version', _project_version_re, _project_version_pattern),
+    ('file_version', 'version', _project_file_version_re, _project_file_version_pattern),
+    ('assembly_version', 'version', _project_assembly_version_re, _project_assembly_version_pattern),
+    ('framework', 'framework', _project_framework_re, _project_framework_pattern),
+)
+
+
+def rewrite_project(project_file, version=None, framework=None) -> Optional[dict]:
+    """
+    Set the version and/or target framework of a project file in a single pass.
+
+    The file is only written if its content changes, so that its mtime is left alone for
+    MSBuild's incremental build checks. Returns the previous values of the tags,
+    keyed `version`, `file_version`, `assembly_version` and `framework`, or None if a tag
+    appears more than once. Such a tag is left alone, along with the others set from the same value,
+    but the remaining tags are still set.
+    """
+    values = {}
+    if version is not None:
+        values['version'] = Version(version).full()
+        logger.info("Setting project version to {}".format(values['version']))
+    if framework is not None:
+        values['framework'] = framework
+        logger.info("Setting project framework to {}".format(framework))
 
     with open(project_file, 'r') as fh:
-        pdata = fh.read()
+        old_data = fh.read()
 
-    ver_matches = list(_project_version_re.finditer(pdata))
-    file_ver_matches = list(_project_file_version_re.finditer(pdata))
-    ass_ver_matches = list(_project_assembly_version_re.finditer(pdata))
-    if len(ver_matches) > 1 or len(file_ver_matches) > 1 or len(ass_ver_matches) > 1:
-        logger.error('Found multiple instances of the version tag(s), bailing.')
-        return None
+    pdata = old_data
+    matches = {
+        name: list(regex.finditer(pdata))
+        for name, value, regex, _pattern in _project_tags
+        if value in values
+    }
 
-    if ver_matches:
-        old_version = ver_matches[0]['version']
-        logger.debug('Old version: {}'.format(old_version))
-    else:
-        old_version = None
+    failed = False
+    for name, value, _regex, _pattern in _project_tags:
+        if value in values and len(matches[name]) > 1:
+            logger.error('Found multiple instances of the {} tag in `{}`, not setting the {}.'.format(name, project_file, value))
+            del values[value]
+            failed = True
 
-    if file_ver_matches:
-        old_file_version = file_ver_matches[0]['version']
-        logger.debug('Old file version: {}'.format(old_file_version))
-    else:
-        old_file_version = None
+    old_values = {}
+    for name, value, regex, pattern in _project_tags:
+        if value not in values:
+            continue
+
+        old_values[name] = matches[name][0].group(value) if matches[name] else None
+        if old_values[name] is not None:
+            logger.debug('Old {}: {}'.format(name, old_values[name]))
 
-    if ass_ver_matches:
-        old_assembly_version = ass_ver_matches[0]['version']
-        logger.debug('Old assembly version: {}'.format(old_assembly_version))
+        pdata = regex.sub(pattern.format(**{value: values[value]}), pdata)
+
+    if pdata != old_data:
+        with open(project_file, 'w') as fh:
+            fh.write(pdata)
     else:
-        old_assembly_version = None
+        logger.debug('`{}` is up to date'.format(project_file))
 
-    pdata = _project_version_re.sub(_project_version_pattern.format(version=version.full()), pdata)
-    pdata = _project_file_version_re.sub(_project_file_version_pattern.format(version=version.full()), pdata)
-    pdata = _project_assembly_version_re.sub(_project_assembly_version_pattern.format(version=version.full()), pdata)
+    if failed:
+        return None
 
-    with open(project_file, 'w') as fh:
-        fh.write(pdata)
+    return old_values
 
-    return (old_version, old_file_version, old_assembly_version)
 
+def rewrite_projects(projects, version=None, framework=None, jobs=None):
+    """
+    `rewrite_project` each of `projects`, in parallel.
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
 
-_project_framework_re = re.compile(r'\<TargetFramework\>(?P<framework>.*?)\</TargetFramework\>')
-_project_framework_pattern = '<TargetFramework>{framework}</TargetFramework>'
+    def rewrite(project):
+        return rewrite_project(project, version=version, framework=framework)
 
+    if jobs > 1 and len(projects) > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(jobs, len(projects))) as executor:
+            return list(executor.map(rewrite, projects))
 
-def set_project_framework(project_file, framework):
-    logger.info("Setting project framework to {}".format(framework))
+    return [rewrite(project) for project in projects]
 
-    with open(project_file, 'r') as fh:
-        pdata = fh.read()
 
-    framework_matches = list(_project_framework_re.finditer(pdata))
-    if len(framework_matches) > 1:
-        logger.error('Found multiple instances of the TargetFramework tag, bailing.')
+def set_project_version(project_file, version):
+    old_values = rewrite_project(project_file, version=version)
+    if old_values is None:
         return None
 
-    if framework_matches:
-        old_framework = framework_matches[0]['framework']
-        logger.debug('Old framework: {}'.format(old_framework))
-    else:
-        old_framework = None
+    return (old_values['version'], old_values['file_version'], old_values['assembly_version'])
 
-    pdata = _project_framework_re.sub(_project_framework_pattern.format(framework=framework), pdata)
 
-    with open(project_file, 'w') as fh:
-        fh.write(pdata)
+def set_project_framework(project_file, framework):
+    old_values = rewrite_project(project_file, framework=framework)
+    if old_values is None:
+        return None
 
-    return old_framework
+    return old_values['framework']
 
 
 _solution_file_project_re = re.compile(r'\s*Project\("[^"]*"\)\s*=\s*"(?P<project_name>[^"]*)",\s*"(?P<project_file>[^"]+proj)",\s*"[^"]*"\s*')
@@ -739,6 +2489,517 @@ def solution_get_projects(sln_file):
 ####################
 
 
+class ArchiveCache(object):
+    """
+    Persistent cache of plugin archive checksums and metadata, stored in a SQLite database.
+
+    Entries are keyed on the absolute path of the file, and are only returned while the
+    size, modification time and inode of the file match the ones they were recorded with.
+    The cache is best-effort; if it can not be used, lookups miss and updates are dropped.
+    """
+    FILENAME = '.jprm-cache.sqlite'
+    # Seconds to wait for another process holding the database, before giving up on a lookup or update
+    TIMEOUT = 1.0
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path
+        self._db = None
+        self._lock = threading.Lock()
+
+        if db_path is None:
+            return
+
+        try:
+            sqlite3.sqlite_version
+        except ImportError:  # Python built without SQLite support
+            logger.warning("SQLite is not available, archive cache disabled.")
+            return
+
+        try:
+            # Autocommit, so the write lock is only held for the duration of each update.
+            # The default rollback journal is kept, as WAL mode does not work on network filesystems.
+            self._db = sqlite3.connect(db_path, timeout=self.TIMEOUT, isolation_level=None, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS archives ('
+                'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, data TEXT NOT NULL)'
+            )
+        except sqlite3.Error as e:
+            logger.warning("Unable to open archive cache `{}`: {}".format(db_path, e))
+            self._db = None
+
+    @classmethod
+    def for_repo(cls, repo_path, enabled=True):
+        if not enabled:
+            return cls()
+
+        return cls(os.path.join(os.path.dirname(repo_path), cls.FILENAME))
+
+    @staticmethod
+    def _signature(st):
+        return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+    def get(self, filename, st=None):
+        if self._db is None:
+            return None
+
+        if st is None:
+            try:
+                st = os.stat(filename)
+            except FileNotFoundError:
+                return None
+
+        try:
+            with self._lock:
+                row = self._db.execute(
+                    'SELECT size, mtime_ns, inode, data FROM archives WHERE path = ?',
+                    (os.path.abspath(filename),),
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Archive cache lookup failed: {}".format(e))
+            return None
+
+        if row is None or tuple(row[:3]) != self._signature(st):
+            return None
+
+        return json.loads(row[3])
+
+    def update(self, filename, st=None, **data):
+        """
+        Merge `data` into the entry for `filename`.
+        Anything recorded for a previous version of the file is discarded.
+        """
+        if self._db is None:
+            return None
+
+        if st is None:
+            st = os.stat(filename)
+
+        entry = self.get(filename, st) or {}
+        for key, value in data.items():
+            if isinstance(value, dict) and isinstance(entry.get(key), dict):
+                entry[key].update(value)
+            else:
+                entry[key] = value
+
+        try:
+            with self._lock:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO archives (path, size, mtime_ns, inode, data) VALUES (?, ?, ?, ?, ?)',
+                    (os.path.abspath(filename), *self._signature(st), json.dumps(entry, sort_keys=True)),
+                )
+        except sqlite3.Error as e:
+            logger.warning("Archive cache update failed: {}".format(e))
+
+        return entry
+
+    def close(self):
+        if self._db is None:
+            return
+
+        try:
+            with self._lock:
+                self._db.close()
+        except sqlite3.Error as e:
+            logger.warning("Unable to write archive cache `{}`: {}".format(self.db_path, e))
+        self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class PluginIngest(object):
+    """
+    Adds a single plugin archive to a repository in two steps.
+
+    `prepare` reads the metadata, checksums the archive, copies it to a staging file
+    next to its destination and reads the plugin image. It does not touch any shared
+    state, so several archives can be prepared concurrently.
+    `commit` moves the staged archive into place and writes the image, and must be
+    called in the order the plugins should be applied.
+    """
+
+    def __init__(self, plugin_file, repo_dir, repo_url='', plugin_url=None, cache=None, checksum_types=('md5',),
+                 placement='copy', blob_store=None, blob_archives=False):
+        self.plugin_file = plugin_file
+        self.repo_dir = repo_dir
+        self.repo_url = repo_url
+        self.plugin_url = plugin_url
+        self.placement = placement
+        self.cache = cache if cache is not None else ArchiveCache()
+        self.checksum_types = ('md5',) + tuple(t for t in checksum_types if t != 'md5')
+        self.blob_store = blob_store
+        self.blob_archives = blob_store is not None and blob_archives
+        # Archives in the blob store are addressed by their SHA-256, whether or not it goes in the manifest
+        self.hash_types = self.checksum_types
+        if self.blob_archives and 'sha256' not in self.hash_types:
+            self.hash_types += ('sha256',)
+
+        self.meta = None
+        self.checksums = None
+        self.image_digest = None
+        self.manifest = None
+        self.plugin_dir = None
+        self.plugin_target = None
+        self.staged_file = None
+        self.image_data = None
+
+    def prepare(self):
+        logger.info("Processing {}".format(self.plugin_file))
+
+        # The archive is opened once; metadata and image are read through the zip index,
+        # and the data is checksummed while it is being copied into the repository.
+        with open(self.plugin_file, 'rb') as fsrc, zipfile.ZipFile(fsrc, 'r') as zf:
+            st = os.fstat(fsrc.fileno())
+            cached = self.cache.get(self.plugin_file, st) or {}
+
+            meta = None
+            meta_sidecar = '{filename}.{meta}'.format(filename=self.plugin_file, meta=JSON_METADATA_FILE)
+            if 'meta' in cached and not os.path.exists(meta_sidecar):
+                meta = cached['meta']
+                logger.info("Read meta of `{}` from cache".format(self.plugin_file))
+            else:
+                meta = read_plugin_meta(self.plugin_file, zf=zf)
+
+            if meta is None:
+                raise ValueError('Metadata not provided')
+
+            checksums = dict(cached.get('checksums', {}))
+            missing_checksums = [t for t in self.checksum_types if t not in checksums]
+            if not self.plugin_url:
+                missing_checksums = [t for t in self.hash_types if t not in checksums]
+
+            slug = plugin_slug(meta['name'])
+            self.plugin_dir = os.path.join(self.repo_dir, slug)
+
+            image = meta.get('image')
+            if image is not None and image in zf.namelist():
+                with zf.open(image, 'r') as fh:
+                    self.image_data = fh.read()
+                    logger.info("Read image from `{}:{}`".format(self.plugin_file, image))
+                self.image_digest = hashlib.sha256(self.image_data).hexdigest()
+
+            fsrc.seek(0)
+            if self.plugin_url:
+                logger.warning("Plugin url is specified, we are NOT copying the plugin file to the repo.")
+                # A lone MD5 may still come from the .md5sum sidecar, see `generate_plugin_manifest`
+                if missing_checksums and missing_checksums != ['md5']:
+                    checksums.update(checksum_stream(fsrc, self.checksum_types))
+            else:
+                self.plugin_target = os.path.join(self.plugin_dir, '{slug}_{version}.zip'.format(
+                    slug=slug,
+                    version=meta['version'],
+                ))
+
+                os.makedirs(self.plugin_dir, exist_ok=True)
+
+                self.staged_file = '{target}.{tag}.tmp'.format(target=self.plugin_target, tag=uuid.uuid4().hex)
+                logger.info("Copying {plugin_file} to {plugin_target}".format(
+                    plugin_file=self.plugin_file,
+                    plugin_target=self.plugin_target,
+                ))
+                if missing_checksums and self.placement == 'copy':
+                    with open(self.staged_file, 'wb') as fdst:
+                        checksums.update(checksum_stream(fsrc, self.hash_types, fdst=fdst))
+                else:
+                    # Let the OS do the copy, or avoid it altogether
+                    method = place_file(self.plugin_file, self.staged_file, self.placement)
+                    logger.debug("Placed {} with {}".format(self.staged_file, method))
+                    if missing_checksums:
+                        checksums.update(checksum_stream(fsrc, self.hash_types))
+
+        manifest_checksums = {t: checksums[t] for t in self.checksum_types if t in checksums}
+        self.manifest = generate_plugin_manifest(
+            self.plugin_file,
+            repo_url=self.repo_url,
+            plugin_url=self.plugin_url,
+            meta=meta,
+            md5=manifest_checksums.get('md5'),
+            checksums=manifest_checksums,
+        )
+        logger.debug(self.manifest)
+
+        self.meta = meta
+        checksums = {t: checksums[t] for t in self.hash_types if t in checksums}
+        self.checksums = dict(checksums, md5=self.manifest['versions'][0]['checksum'])
+        self._update_cache(self.plugin_file, st)
+
+        return self
+
+    def _update_cache(self, filename, st=None):
+        data = {
+            'meta': self.meta,
+            'checksums': self.checksums,
+        }
+        if self.image_digest is not None:
+            data['image'] = {'name': self.meta['image'], 'sha256': self.image_digest}
+
+        self.cache.update(filename, st, **data)
+
+    def _file_digest(self, filename, size=None):
+        """
+        SHA-256 of `filename`, from the archive cache if it is unchanged, or None if it does not
+        exist or is not `size` bytes long.
+        """
+        try:
+            st = os.stat(filename)
+        except FileNotFoundError:
+            return None
+
+        if size is not None and st.st_size != size:
+            logger.info("Existing `{}` differs in size ({}).".format(filename, st.st_size))
+            return None
+
+        cached = self.cache.get(filename, st) or {}
+        digest = cached.get('checksums', {}).get('sha256')
+        if digest is None:
+            digest = checksum_file(filename, checksum_type='sha256')
+            self.cache.update(filename, st, checksums={'sha256': digest})
+        return digest
+
+    def commit(self):
+        if self.staged_file is not None:
+            if self.blob_archives:
+                digest = self.checksums['sha256']
+                self.blob_store.add_file(digest, self.staged_file)
+                self.blob_store.link(digest, self.plugin_target)
+                os.remove(self.staged_file)
+            else:
+                os.replace(self.staged_file, self.plugin_target)
+            self.staged_file = None
+            self._update_cache(self.plugin_target)
+
+        if self.image_data is not None:
+            image_target_path = os.path.join(self.plugin_dir, self.manifest["image"])
+            os.makedirs(self.plugin_dir, exist_ok=True)
+
+            if self.blob_store is not None:
+                self.blob_store.add_bytes(self.image_digest, self.image_data)
+                if self.blob_store.link(self.image_digest, image_target_path):
+                    logger.info("Linked image `{}` to blob {}.".format(image_target_path, self.image_digest))
+                else:
+                    logger.info("Existing image same as new, skipping copy.")
+            elif self._file_digest(image_target_path, size=len(self.image_data)) == self.image_digest:
+                logger.info("Existing image same as new, skipping copy.")
+            else:
+                logger.info("Writing image to `{}`.".format(image_target_path))
+                _write_atomic(image_target_path, self.image_data)
+                self.cache.update(image_target_path, checksums={'sha256': self.image_digest})
+            self.image_data = None
+
+    def discard(self):
+        if self.staged_file is not None:
+            try:
+                os.remove(self.staged_file)
+            except FileNotFoundError:
+                pass
+            self.staged_file = None
+
+
+def local_archive_path(repo_dir, entry, release) -> Optional[str]:
+    """
+    Path of the archive of a release in the repository directory,
+    or None if the release points at an archive hosted elsewhere.
+
+    The path comes from the last two segments of the `sourceUrl`, rather than the current
+    name of the plugin, so releases published before a rename are found under their old slug.
+    """
+    segments = release.get('sourceUrl', '').split('?')[0].split('#')[0].rsplit('/', 2)
+    if len(segments) == 3 and segments[1] not in ('', '.', '..') and segments[2] not in ('', '.', '..'):
+        slug, filename = segments[1:]
+        path = os.path.join(repo_dir, slug, filename)
+        if os.path.exists(path) or filename == '{slug}_{version}.zip'.format(slug=slug, version=release['version']):
+            return path
+
+    return None
+
+
+def verify_archive(path, checksums, cache=None, incremental=False):
+    """
+    Check an archive against the checksums recorded for it, and test the CRCs of its contents.
+    Returns a tuple of status (`ok`, `skipped`, `missing`, `mismatch` or `corrupt`) and detail.
+    """
+    if cache is None:
+        cache = ArchiveCache()
+
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return 'missing', ''
+
+    cached = cache.get(path, st) or {}
+    if incremental and cached.get('verified') == checksums:
+        return 'skipped', 'unchanged since last verified'
+
+    actual = checksum_file_multi(path, tuple(checksums))
+    for checksum_type, expected in checksums.items():
+        if actual[checksum_type] != expected.lower():
+            return 'mismatch', '{} is {}, expected {}'.format(checksum_type, actual[checksum_type], expected)
+
+    try:
+        with zipfile.ZipFile(path, 'r') as zf:
+            bad_file = zf.testzip()
+    except (zipfile.BadZipFile, OSError, EOFError) as e:
+        cache.update(path, st, checksums=actual)
+        return 'corrupt', str(e)
+
+    if bad_file is not None:
+        cache.update(path, st, checksums=actual)
+        return 'corrupt', 'bad CRC for `{}`'.format(bad_file)
+
+    cache.update(path, st, checksums=actual, verified=checksums)
+    return 'ok', ''
+
+
+def verify_repository(repo_path, jobs=None, cache=None, incremental=False):
+    """
+    Verify every archive in the repository directory referenced by the manifest.
+    Returns a list of `(status, detail, entry, release, path)` in manifest order.
+    """
+    repo_dir = os.path.dirname(repo_path)
+    repository = load_repository(repo_path)
+
+    archives = []
+    for entry in repository:
+        for release in entry.get('versions', []):
+            path = local_archive_path(repo_dir, entry, release)
+            if path is None:
+                logger.info("Skipping {} {}, hosted at `{}`".format(entry.get('name'), release.get('version'), release.get('sourceUrl')))
+                continue
+
+            checksums = {'md5': release['checksum']}
+            checksums.update(release.get('checksums', {}))
+            archives.append((entry, release, path, checksums))
+
+    def verify(archive):
+        entry, release, path, checksums = archive
+        status, detail = verify_archive(path, checksums, cache=cache, incremental=incremental)
+        logger.debug("{}: {} {}".format(path, status, detail))
+        return status, detail, entry, release, path
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    if jobs > 1 and len(archives) > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            return list(executor.map(verify, archives))
+
+    return [verify(archive) for archive in archives]
+
+
+def find_repository_archives(repo_dir):
+    """
+    Plugin archives in the repository directory, `<slug>/<slug>_<version>.zip`, in sorted order.
+    """
+    archives = []
+    with os.scandir(repo_dir) as it:
+        plugin_dirs = [entry for entry in it if entry.is_dir()]
+
+    for plugin_dir in plugin_dirs:
+        prefix = plugin_dir.name + '_'
+        with os.scandir(plugin_dir.path) as it:
+            archives.extend(
+                entry.path for entry in it
+                if entry.name.startswith(prefix) and entry.name.endswith('.zip') and entry.is_file()
+            )
+
+    return sorted(archives)
+
+
+def index_archive(filename, repo_url='', cache=None, checksum_types=('md5',)):
+    """
+    Plugin manifest for an archive already in the repository directory,
+    or None if the archive is not where its metadata says it should be.
+    """
+    if cache is None:
+        cache = ArchiveCache()
+    checksum_types = ('md5',) + tuple(t for t in checksum_types if t != 'md5')
+
+    st = os.stat(filename)
+    cached = cache.get(filename, st) or {}
+
+    meta = cached.get('meta')
+    if meta is None:
+        meta = read_plugin_meta(filename)
+    if meta is None:
+        logger.warning("No metadata in `{}`, skipping.".format(filename))
+        return None
+
+    slug = plugin_slug(meta['name'])
+    expected = os.path.join(slug, '{slug}_{version}.zip'.format(slug=slug, version=meta['version']))
+    if not filename.endswith(os.sep + expected):
+        logger.warning("`{}` should be at `{}`, skipping.".format(filename, expected))
+        return None
+
+    checksums = dict(cached.get('checksums', {}))
+    missing_checksums = [t for t in checksum_types if t not in checksums]
+    if missing_checksums:
+        checksums.update(checksum_file_multi(filename, tuple(missing_checksums)))
+
+    cache.update(filename, st, meta=meta, checksums=checksums)
+
+    return generate_plugin_manifest(
+        filename,
+        repo_url=repo_url,
+        meta=meta,
+        md5=checksums['md5'],
+        checksums={t: checksums[t] for t in checksum_types},
+    )
+
+
+def reindex_repository(repo_path, repo_url='', jobs=None, cache=None, checksum_types=('md5',)) -> RepositoryIndex:
+    """
+    Rebuild the manifest at `repo_path` from the plugin archives in the repository directory.
+    The archives are read in parallel, and the manifest is written once.
+
+    The repository is locked for the whole scan. Journaled operations from before the scan
+    are superseded by the archives on disk, later ones are kept for the next load.
+    """
+    repo_dir = os.path.dirname(repo_path)
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    def index(filename):
+        return index_archive(filename, repo_url=repo_url, cache=cache, checksum_types=checksum_types)
+
+    with repository_lock(repo_path):
+        # Writers place their archives before journaling them, so these are all on disk.
+        _operations, journal_offset = RepositoryJournal(repo_path).read()
+
+        archives = find_repository_archives(repo_dir)
+        logger.info("Found {} archive(s) in `{}`".format(len(archives), repo_dir))
+
+        if jobs > 1 and len(archives) > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+                plugin_manifests = list(executor.map(index, archives))
+        else:
+            plugin_manifests = [index(filename) for filename in archives]
+
+        # Merge plugins in path order, so that the result is the same regardless of the number of jobs,
+        # and the releases of each oldest first, so the metadata of the newest one wins like with `repo add`.
+        by_guid = collections.OrderedDict()
+        for plugin_manifest in plugin_manifests:
+            if plugin_manifest is not None:
+                by_guid.setdefault(normalize_guid(plugin_manifest['guid']), []).append(plugin_manifest)
+
+        repository = RepositoryIndex(storage=get_repo_storage(repo_path))
+        for releases in by_guid.values():
+            sort_versions(releases, key=lambda plugin_manifest: plugin_manifest['versions'][0]['version'])
+            for plugin_manifest in releases:
+                repository.merge(plugin_manifest)
+
+        repository.journal_offset = journal_offset
+        save_repository(repo_path, repository)
+
+    return repository
+
+
+####################
+
+
 class RepoPathParam(click.ParamType):
     name = 'repo_path'
 
@@ -820,17 +3081,132 @@ def cli_plugin():
     type=int,
     help='Max number of cores to use during build (1)',
 )
-def cli_plugin_build(path, output, dotnet_configuration, dotnet_framework, max_cpu_count, version):
-    build_cfg = get_config(path)
+@click.option('--reproducible/--no-reproducible',
+    default=None,
+    help='Package byte for byte reproducibly, timestamped by SOURCE_DATE_EPOCH or the last git commit '
+         '(default when SOURCE_DATE_EPOCH is set)',
+)
+@click.option('--compression-level',
+    default=None,
+    type=click.IntRange(min=0, max=9),
+    help='Zlib compression level of the plugin zip (6)',
+)
+@click.option('--incremental/--no-incremental',
+    default=False,
+    help='Skip dotnet clean, and the cold dotnet restore, when the inputs are unchanged since the last build',
+)
+@click.option('--timings', 'show_timings',
+    is_flag=True,
+    default=False,
+    help='Print how long each phase of the build took, to stderr',
+)
+@click.option('--timings-json',
+    default=None,
+    type=click.Path(dir_okay=False, writable=True),
+    help='Write how long each phase of the build took to this JSON file',
+)
+def cli_plugin_build(path, output, dotnet_configuration, dotnet_framework, max_cpu_count, version, reproducible,
+                     compression_level, incremental, show_timings, timings_json):
+    timings = BuildTimings()
+    with timings.phase('config'):
+        build_cfg = get_config(path)
     if build_cfg is None:
         raise click.UsageError('No build config found in `{}`'.format(path))
 
     with tempfile.TemporaryDirectory() as bintemp:
         build_plugin(path, output=bintemp, build_cfg=build_cfg, dotnet_config=dotnet_configuration, dotnet_framework=dotnet_framework,
-                     version=version, max_cpu_count=max_cpu_count)
-        filename = package_plugin(path, build_cfg=build_cfg, version=version, binary_path=bintemp, output=output)
+                     version=version, max_cpu_count=max_cpu_count, incremental=incremental, timings=timings)
+        filename = package_plugin(path, build_cfg=build_cfg, version=version, binary_path=bintemp, output=output,
+                                  reproducible=reproducible, compresslevel=compression_level, timings=timings)
         click.echo(filename)
 
+    if show_timings:
+        click.echo(timings.table(), err=True)
+
+    if timings_json is not None:
+        with open(timings_json, 'w') as fh:
+            json.dump(timings.as_dict(plugin=build_cfg['name'], path=path, artifact=filename), fh, indent=4)
+
+
+@cli_plugin.command('build-many')
+@click.argument('root',
+    nargs=1,
+    required=False,
+    default='.',
+    type=click.Path(exists=True, file_okay=False, dir_okay=True),
+)
+@click.option('--output', '-o',
+    default='./artifacts/',
+    type=click.Path(exists=False, file_okay=False, dir_okay=True, writable=True),
+    help='Directory to place the plugin zip files in (./artifacts/)',
+)
+@click.option('--dotnet-configuration',
+    default='Release',
+    help='Dotnet configuration',
+)
+@click.option('dotnet_frameworks', '--dotnet-framework',
+    default=[],
+    multiple=True,
+    help='Dotnet framework to build for, may be given several times (framework of each plugin)',
+)
+@click.option('--jobs', '-j',
+    default=None,
+    type=click.IntRange(min=1),
+    help='Number of plugins to build at once (CPU budget)',
+)
+@click.option('--cpu-budget',
+    default=None,
+    type=click.IntRange(min=1),
+    help='Total number of cores to use, split between the builds running at once (number of CPUs)',
+)
+@click.option('--incremental/--no-incremental',
+    default=False,
+    help='Skip dotnet clean, and the cold dotnet restore, when the inputs are unchanged since the last build',
+)
+@click.option('--reproducible/--no-reproducible',
+    default=None,
+    help='Package byte for byte reproducibly (default when SOURCE_DATE_EPOCH is set)',
+)
+@click.option('--compression-level',
+    default=None,
+    type=click.IntRange(min=0, max=9),
+    help='Zlib compression level of the plugin zips (6)',
+)
+@click.option('--timings-json',
+    default=None,
+    type=click.Path(dir_okay=False, writable=True),
+    help='Write how long each phase of each build took to this JSON file',
+)
+def cli_plugin_build_many(root, output, dotnet_configuration, dotnet_frameworks, jobs, cpu_budget, incremental,
+                          reproducible, compression_level, timings_json):
+    plans = plan_plugin_builds(
+        root,
+        output,
+        frameworks=dotnet_frameworks,
+        dotnet_config=dotnet_configuration,
+        incremental=incremental,
+        reproducible=reproducible,
+        compresslevel=compression_level,
+    )
+    if not plans:
+        raise click.UsageError('No plugins found in `{}`'.format(root))
+
+    results = run_plugin_builds(plans, jobs=jobs, cpu_budget=cpu_budget)
+
+    click.echo(tabulate.tabulate(
+        [[job.build_cfg['name'], job.framework, job.status.upper(), job.artifact or job.error, '{:.1f}s'.format(job.duration)]
+         for job in results],
+        headers=('PLUGIN', 'FRAMEWORK', 'STATUS', 'ARTIFACT', 'DURATION'),
+        tablefmt='plain',
+    ))
+
+    if timings_json is not None:
+        with open(timings_json, 'w') as fh:
+            json.dump([job.timings_dict() for job in results], fh, indent=4)
+
+    if any(job.status != 'ok' for job in results):
+        exit(1)
+
 
 @cli.group('repo')
 def cli_repo():
@@ -843,13 +3219,25 @@ def cli_repo():
     required=True,
     type=RepoPathParam(should_exist=False),
 )
-def cli_repo_init(repo_path):
+@click.option('--layout',
+    default=None,
+    type=click.Choice(REPO_LAYOUTS),
+    help='Storage layout of the repository (single)',
+)
+def cli_repo_init(repo_path, layout):
     if os.path.exists(repo_path):
         raise click.BadParameter("File already exists: `{}`".format(repo_path))
 
-    with open(repo_path, 'w') as fh:
-        json.dump([], fh)
-        logger.info("Initialized `{}`.".format(repo_path))
+    if layout is not None:
+        config_path = os.path.join(os.path.dirname(repo_path), REPO_CONFIG_FILE)
+        repo_config = get_repo_config(repo_path)
+        repo_config['layout'] = layout
+        with open(config_path, 'w') as fh:
+            yaml.safe_dump(repo_config, fh, default_flow_style=False)
+            logger.info("Wrote repository settings to `{}`.".format(config_path))
+
+    save_repository(repo_path, RepositoryIndex(storage=get_repo_storage(repo_path)))
+    logger.info("Initialized `{}`.".format(repo_path))
 
 
 @cli_repo.command('add')
@@ -872,107 +3260,89 @@ def cli_repo_init(repo_path):
     help='Full URL of the plugin zip file',
     multiple=True,
 )
-def cli_repo_add(repo_path, plugins, url='', plugin_urls=[]):
-    with open(repo_path, 'r') as fh:
-        logger.debug('Reading repo manifest from {}'.format(repo_path))
-        repo_manifest = json.load(fh)
-
+@click.option('--jobs', '-j',
+    default=1,
+    type=click.IntRange(min=1),
+    help='Number of plugin files to process in parallel (1)',
+)
+@click.option('--cache/--no-cache',
+    default=True,
+    help='Use the archive checksum cache in the repository directory',
+)
+@click.option('checksum_types', '--checksum', '-c',
+    default=[],
+    type=click.Choice(['sha1', 'sha256', 'sha512']),
+    multiple=True,
+    help='Additional checksum to record in the manifest, alongside the MD5',
+)
+@click.option('--coalesce/--no-coalesce',
+    default=None,
+    help='Queue the changes for whichever concurrent repo add writes the manifest first',
+)
+@click.option('--placement',
+    default=None,
+    type=click.Choice(REPO_PLACEMENTS),
+    help='How plugin files are put into the repository; auto tries a reflink, then a hardlink (placement setting, or copy)',
+)
+def cli_repo_add(repo_path, plugins, url='', plugin_urls=[], jobs=1, cache=True, checksum_types=[], coalesce=None,
+                 placement=None):
     if plugin_urls and len(plugin_urls) != len(plugins):
         logger.error("When plugin url is specified, the number of times it's specified must match the number of plugins.")
         exit(1)
 
-    for i, plugin_file in enumerate(plugins):
-        logger.info("Processing {}".format(plugin_file))
+    # TODO: Add support for separate repo file path
+    repo_dir = os.path.dirname(repo_path)
 
-        plugin_url = None
-        if plugin_urls:
-            plugin_url = plugin_urls[i]
+    archive_cache = ArchiveCache.for_repo(repo_path, enabled=cache)
 
-        plugin_manifest = generate_plugin_manifest(plugin_file, repo_url=url, plugin_url=plugin_url)
-        logger.debug(plugin_manifest)
+    if placement is None:
+        placement = get_repo_config(repo_path).get('placement', 'copy')
+        if placement not in REPO_PLACEMENTS:
+            raise click.BadParameter("Unknown placement `{}` in `{}`".format(placement, REPO_CONFIG_FILE))
 
-        # TODO: Add support for separate repo file path
-        repo_dir = os.path.dirname(repo_path)
-        name = plugin_manifest['name']
-        slug = slugify(name)
-        version = plugin_manifest['versions'][0]['version']
-        guid = uuid.UUID(plugin_manifest['guid'])
+    try:
+        blob_store = BlobStore.for_repo(repo_path)
+    except ValueError as e:
+        raise click.BadParameter("{} in `{}`".format(e, REPO_CONFIG_FILE))
+    blob_archives = get_repo_config(repo_path).get('blobs') == 'all'
 
-        logger.info("Adding {plugin} version {version} to {repo}".format(
-            plugin=name,
-            version=version,
-            repo=repo_path,
-        ))
+    ingests = []
+    for i, plugin_file in enumerate(plugins):
+        plugin_url = None
+        if plugin_urls:
+            plugin_url = plugin_urls[i]
 
-        plugin_dir = os.path.join(repo_dir, slug)
+        ingests.append(PluginIngest(plugin_file, repo_dir, repo_url=url, plugin_url=plugin_url, cache=archive_cache,
+                                    checksum_types=checksum_types, placement=placement, blob_store=blob_store,
+                                    blob_archives=blob_archives))
 
-        if plugin_url:
-            logger.warning("Plugin url is specified, we are NOT copying the plugin file to the repo.")
+    try:
+        if jobs > 1 and len(ingests) > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+                list(executor.map(PluginIngest.prepare, ingests))
         else:
-            plugin_target = os.path.join(plugin_dir, '{slug}_{version}.zip'.format(
-                slug=slug,
-                version=version
+            for ingest in ingests:
+                ingest.prepare()
+
+        # Merge in command line order, so that the result is the same regardless of the number of jobs.
+        operations = []
+        for ingest in ingests:
+            plugin_manifest = ingest.manifest
+
+            logger.info("Adding {plugin} version {version} to {repo}".format(
+                plugin=plugin_manifest['name'],
+                version=plugin_manifest['versions'][0]['version'],
+                repo=repo_path,
             ))
 
-            if not os.path.exists(plugin_dir):
-                os.makedirs(plugin_dir)
+            ingest.commit()
+            operations.append({'op': 'add', 'plugin': plugin_manifest})
+    finally:
+        for ingest in ingests:
+            ingest.discard()
+        archive_cache.close()
 
-            logger.info("Copying {plugin_file} to {plugin_target}".format(
-                plugin_file=plugin_file,
-                plugin_target=plugin_target,
-            ))
-            shutil.copyfile(plugin_file, plugin_target)
-
-        if "image" in plugin_manifest:
-            image_data = None
-            with zipfile.ZipFile(plugin_file, 'r') as zf:
-                if plugin_manifest["image"] in zf.namelist():
-                    with zf.open(plugin_manifest["image"], 'r') as fh:
-                        image_data = fh.read()
-                        logger.info("Read image from `{}:{}`".format(plugin_file, plugin_manifest["image"]))
-
-            if image_data is not None:
-                image_target_path = os.path.join(plugin_dir, plugin_manifest["image"])
-
-                write_image = True
-                if os.path.exists(image_target_path):
-                    existing_image_size = os.stat(image_target_path).st_size
-                    if existing_image_size == len(image_data):
-                        with open(image_target_path, "rb") as fh:
-                            existing_image = fh.read()
-
-                        if existing_image == image_data:
-                            write_image = False
-                            logger.info("Existing image same as new, skipping copy.")
-                        del existing_image
-                    else:
-                        logger.info("Existing image differs in size ({}).".format(existing_image_size))
-
-                if write_image:
-                    logger.info("Writing image to `{}`.".format(image_target_path))
-                    if not os.path.exists(plugin_dir):
-                        os.makedirs(plugin_dir)
-                    with open(image_target_path, "wb") as fh:
-                        fh.write(image_data)
-                del image_data
-
-        updated = False
-        for p_manifest in repo_manifest:
-            if uuid.UUID(p_manifest.get('guid')) == guid:
-                update_plugin_manifest(p_manifest, plugin_manifest)
-                updated = True
-
-        if not updated:
-            repo_manifest.append(plugin_manifest)
-
-    tmpfile = repo_path + '.tmp'
-    with open(tmpfile, 'w') as fh:
-        logging.debug('Writing repo manifest to {}'.format(tmpfile))
-        json.dump(repo_manifest, fh, indent=4)
-        fh.flush()
-        os.fsync(fh.fileno())
-    logging.debug('Renaming {} to {}'.format(tmpfile, repo_path))
-    os.replace(tmpfile, repo_path)
+    commit_repository_operations(repo_path, operations, coalesce=coalesce)
 
 
 @cli_repo.command('list')
@@ -987,41 +3357,30 @@ def cli_repo_add(repo_path, plugins, url='', plugin_urls=[]):
     default=None,
 )
 def cli_repo_list(repo_path, plugin):
-    with open(repo_path, 'r') as fh:
-        logger.debug('Reading repo manifest from {}'.format(repo_path))
-        repo_manifest = json.load(fh)
+    repository = load_repository(repo_path)
 
     if plugin is not None:
-        try:
-            plugin = str(uuid.UUID(plugin))
-        except ValueError:
-            pass
-
-        items = [item for item in repo_manifest if plugin in [item.get('name'), item.get('guid'), slugify(item.get('name'))]]
-        if items:
-            item = items[0]
+        item = repository.get(plugin)
+        if item is not None:
             for version in item.get('versions', []):
                 click.echo(version.get('version'))
         else:
-            raise click.UsageError('PLUGIN `{}` not found in `{}`'.format(plugin, repo_path))
+            raise click.UsageError('PLUGIN `{}` not found in `{}`'.format(normalize_guid(plugin), repo_path))
 
     else:
         table = []
-        for item in repo_manifest:
+        for item in repository:
             name = item.get('name')
             guid = item.get('guid')
-            versions = sorted(
-                [release.get('version', '0.0') for release in item.get('versions', [])],
-                key = lambda rel: Version(rel),
-                reverse = True,
-            )
+            versions = [release.get('version', '0.0') for release in item.get('versions', [])]
+            sort_versions(versions, reverse=True)
 
             if versions:
                 version = versions[0]
             else:
                 version = ''
 
-            table.append([name, version, slugify(name), guid])
+            table.append([name, version, plugin_slug(name), guid])
 
         if table:
             click.echo(tabulate.tabulate(table, headers=('NAME', 'VERSION', 'SLUG', 'GUID'), tablefmt='plain', colalign=('left', 'right', 'left')))
@@ -1045,34 +3404,112 @@ def cli_repo_list(repo_path, plugin):
     type=Version,
 )
 def cli_repo_remove(repo_path, plugin, version: Optional[Version]):
-    with open(repo_path, 'r') as fh:
-        logger.debug('Reading repo manifest from {}'.format(repo_path))
-        repo_manifest = json.load(fh)
+    repository = load_repository(repo_path)
 
-    plugin_manifest = get_plugin_from_manifest(repo_manifest, plugin)
+    plugin_manifest = repository.get(plugin)
     if plugin_manifest is None:
         raise click.UsageError('PLUGIN `{}` not found in `{}`'.format(plugin, repo_path))
 
+    guid = normalize_guid(plugin_manifest.get('guid'))
     if version is None:
         logger.warning(f"Removing plugin {plugin_manifest.get('name')})")
-        repo_manifest.remove(plugin_manifest)
+        operations = [{'op': 'remove', 'plugin': guid}]
         click.echo(f"removed {plugin_manifest.get('guid')}")
     else:
         version_str = version.full()
-        for release in list(plugin_manifest.get('versions', [])):
+        operations = [{'op': 'remove_version', 'plugin': guid, 'version': version_str}]
+        for release in plugin_manifest.get('versions', []):
             if release.get('version') == version_str:
                 logger.warning(f"Removing version {version} of plugin {plugin_manifest.get('name')})")
-                plugin_manifest['versions'].remove(release)
                 click.echo(f"removed {plugin_manifest.get('guid')} {version_str}")
 
-    tmpfile = repo_path + '.tmp'
-    with open(tmpfile, 'w') as fh:
-        logging.debug('Writing repo manifest to {}'.format(tmpfile))
-        json.dump(repo_manifest, fh, indent=4)
-        fh.flush()
-        os.fsync(fh.fileno())
-    logging.debug('Renaming {} to {}'.format(tmpfile, repo_path))
-    os.replace(tmpfile, repo_path)
+    commit_repository_operations(repo_path, operations)
+
+
+@cli_repo.command('verify')
+@click.argument('repo_path',
+    nargs=1,
+    required=True,
+    type=RepoPathParam(should_exist=True),
+)
+@click.option('--jobs', '-j',
+    default=None,
+    type=click.IntRange(min=1),
+    help='Number of archives to verify in parallel (number of CPUs)',
+)
+@click.option('--incremental', '-i',
+    is_flag=True,
+    default=False,
+    help='Skip archives that are unchanged since they last verified successfully',
+)
+def cli_repo_verify(repo_path, jobs, incremental):
+    with ArchiveCache.for_repo(repo_path) as archive_cache:
+        results = verify_repository(repo_path, jobs=jobs, cache=archive_cache, incremental=incremental)
+
+    counts = {}
+    table = []
+    for status, detail, entry, release, path in results:
+        counts[status] = counts.get(status, 0) + 1
+        if status not in ('ok', 'skipped'):
+            table.append([status.upper(), entry.get('name'), release.get('version'), path, detail])
+
+    if table:
+        click.echo(tabulate.tabulate(table, headers=('STATUS', 'PLUGIN', 'VERSION', 'FILE', 'DETAIL'), tablefmt='plain'))
+
+    logger.info("Verified {} archive(s): {}".format(
+        len(results),
+        ', '.join('{} {}'.format(count, status) for status, count in sorted(counts.items())) or 'none',
+    ))
+
+    if table:
+        exit(1)
+
+
+@cli_repo.command('reindex')
+@click.argument('repo_path',
+    nargs=1,
+    required=True,
+    type=RepoPathParam(),
+)
+@click.option('--url', '-u',
+    default='',
+    help='Repository public base URL',
+)
+@click.option('--jobs', '-j',
+    default=None,
+    type=click.IntRange(min=1),
+    help='Number of archives to read in parallel (number of CPUs)',
+)
+@click.option('--cache/--no-cache',
+    default=True,
+    help='Use the archive checksum cache in the repository directory',
+)
+@click.option('checksum_types', '--checksum', '-c',
+    default=[],
+    type=click.Choice(['sha1', 'sha256', 'sha512']),
+    multiple=True,
+    help='Additional checksum to record in the manifest, alongside the MD5',
+)
+def cli_repo_reindex(repo_path, url='', jobs=None, cache=True, checksum_types=[]):
+    with ArchiveCache.for_repo(repo_path, enabled=cache) as archive_cache:
+        repository = reindex_repository(repo_path, repo_url=url, jobs=jobs, cache=archive_cache,
+                                        checksum_types=checksum_types)
+
+    logger.info("Wrote {} plugin(s) with {} version(s) to `{}`".format(
+        len(repository.manifest),
+        sum(len(entry['versions']) for entry in repository),
+        repo_path,
+    ))
+
+
+@cli_repo.command('compact')
+@click.argument('repo_path',
+    nargs=1,
+    required=True,
+    type=RepoPathParam(should_exist=True),
+)
+def cli_repo_compact(repo_path):
+    compact_repository(repo_path)
 
 
 ####################
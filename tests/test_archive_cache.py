@@ -0,0 +1,111 @@
+import os
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+from testfixtures import LogCapture
+import jprm
+
+from .test_utils import TEST_DATA_DIR, json_load
+
+
+def test_archive_cache(tmp_path: Path):
+    archive = tmp_path / "archive.zip"
+    archive.write_bytes(b"12345")
+
+    with jprm.ArchiveCache(str(tmp_path / "cache.sqlite")) as cache:
+        assert cache.get(archive) is None
+
+        cache.update(archive, checksums={"md5": "abc"}, meta={"name": "A"})
+        cache.update(archive, checksums={"sha256": "def"})
+        assert cache.get(archive) == {
+            "checksums": {"md5": "abc", "sha256": "def"},
+            "meta": {"name": "A"},
+        }
+
+    with jprm.ArchiveCache(str(tmp_path / "cache.sqlite")) as cache:
+        assert cache.get(archive)["meta"] == {"name": "A"}
+
+        archive.write_bytes(b"123456")
+        assert cache.get(archive) is None
+
+        cache.update(archive, checksums={"sha256": "123"})
+        assert cache.get(archive) == {"checksums": {"sha256": "123"}}
+
+
+def test_archive_cache_concurrent(tmp_path: Path):
+    archive = tmp_path / "archive.zip"
+    archive.write_bytes(b"12345")
+
+    # Updates are committed right away, and do not hold the database locked for other processes
+    with jprm.ArchiveCache(str(tmp_path / "cache.sqlite")) as first, \
+            jprm.ArchiveCache(str(tmp_path / "cache.sqlite")) as second:
+        first.update(archive, checksums={"md5": "abc"})
+        with LogCapture() as log:
+            second.update(archive, meta={"name": "A"})
+        log.check()
+        assert first.get(archive) == {"checksums": {"md5": "abc"}, "meta": {"name": "A"}}
+
+
+def test_archive_cache_disabled(tmp_path: Path):
+    archive = tmp_path / "archive.zip"
+    archive.write_bytes(b"12345")
+
+    with jprm.ArchiveCache() as cache:
+        cache.update(archive, checksums={"md5": "abc"})
+        assert cache.get(archive) is None
+
+
+def test_read_checksum_file(tmp_path: Path):
+    archive = tmp_path / "archive.zip"
+    archive.write_bytes(b"12345")
+    sidecar = tmp_path / "archive.zip.md5sum"
+
+    assert jprm.read_checksum_file(str(archive)) is None
+
+    sidecar.write_text("827CCB0EEA8A706C4C34A16891F84E7B *archive.zip\n")
+    assert jprm.read_checksum_file(str(archive)) == "827ccb0eea8a706c4c34a16891f84e7b"
+
+    sidecar.write_text("827ccb0eea8a706c4c34a16891f84e7b *other.zip\n")
+    assert jprm.read_checksum_file(str(archive)) is None
+
+    sidecar.write_text("827ccb0eea8a706c4c34a16891f84e7b *archive.zip\n")
+    st = sidecar.stat()
+    os.utime(sidecar, ns=(st.st_atime_ns, st.st_mtime_ns - 10_000_000_000))
+    assert jprm.read_checksum_file(str(archive)) is None
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "pluginA_1.0.0.zip",
+    TEST_DATA_DIR / "manifest_pluginA.json",
+)
+@pytest.mark.parametrize("cache", [True, False])
+def test_repo_add_cache(cache: bool, cli_runner: CliRunner, tmp_path: Path, datafiles: Path):
+    manifest_file = tmp_path / "repo.json"
+    cli_runner.invoke(jprm.cli, ["--verbosity=debug", "repo", "init", str(manifest_file)])
+
+    args = [
+        "--verbosity=debug",
+        "repo",
+        "add",
+        "--cache" if cache else "--no-cache",
+        str(manifest_file),
+        str(datafiles / "pluginA_1.0.0.zip"),
+    ]
+
+    result = cli_runner.invoke(jprm.cli, args)
+    assert result.exit_code == 0
+    assert (tmp_path / jprm.ArchiveCache.FILENAME).exists() == cache
+
+    with LogCapture("jprm") as capture:
+        result = cli_runner.invoke(jprm.cli, args)
+        assert result.exit_code == 0
+
+    cache_hit = (
+        "jprm",
+        "INFO",
+        f"Read meta of `{datafiles / 'pluginA_1.0.0.zip'}` from cache",
+    )
+    assert (cache_hit in capture.actual()) == cache
+
+    assert json_load(manifest_file) == json_load(datafiles / "manifest_pluginA.json")
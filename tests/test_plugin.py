@@ -1,10 +1,15 @@
+import hashlib
+import json
+import os
+import sys
 from pathlib import Path
 import shutil
+import zipfile
 
 import pytest
 import jprm
 
-from .test_utils import TEST_DATA_DIR
+from .test_utils import TEST_DATA_DIR, json_load
 
 
 @pytest.mark.datafiles(
@@ -37,3 +42,316 @@ def test_package_plugin(tmp_path_factory, datafiles: Path):
 
     # res = jprm.run_os_command('unzip -t plugin-a_5.0.0.0.zip', cwd=str(artifacts))
     # assert res[2] == 0
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "jprm.yaml",
+    TEST_DATA_DIR / "image.png",
+)
+def test_package_plugin_reproducible(tmp_path_factory, datafiles: Path, monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1600000000")
+
+    bindir: Path = tmp_path_factory.mktemp("bin")
+    plugin: Path = tmp_path_factory.mktemp("plugin")
+    artifacts: Path = tmp_path_factory.mktemp("artifacts")
+
+    (bindir / "dummy.dll").write_text("dummy", "utf-8")
+    shutil.copy(datafiles / "jprm.yaml", plugin)
+    shutil.copy(datafiles / "image.png", plugin)
+
+    def package():
+        return Path(
+            jprm.package_plugin(
+                str(plugin), version="5.0", binary_path=str(bindir), output=str(artifacts)
+            )
+        )
+
+    output_path = package()
+    first = output_path.read_bytes()
+    first_mtime = output_path.stat().st_mtime_ns
+
+    with zipfile.ZipFile(output_path) as zf:
+        names = zf.namelist()
+        assert names == sorted(names)
+        assert {info.date_time for info in zf.infolist()} == {(2020, 9, 13, 12, 26, 40)}
+        meta = json.loads(zf.read("meta.json"))
+    assert meta["timestamp"] == "2020-09-13T12:26:40Z"
+
+    # Same inputs, newer mtimes: the existing zip is left alone
+    os.utime(bindir / "dummy.dll", (1700000000, 1700000000))
+    assert package() == output_path
+    assert output_path.stat().st_mtime_ns == first_mtime
+    assert jprm.read_checksum_file(str(output_path)) == hashlib.md5(first).hexdigest()
+
+    # Rewritten from scratch, the zip is byte for byte the same
+    output_path.unlink()
+    assert package().read_bytes() == first
+
+    (bindir / "dummy.dll").write_text("changed", "utf-8")
+    assert package().read_bytes() != first
+
+
+DOTNET_SHIM = """#!/bin/sh
+echo "$*" >> "$DOTNET_SHIM_LOG"
+if [ -e FAIL ]; then
+    echo "error: the build failed" >&2
+    exit 1
+fi
+case "$1" in
+    restore)
+        mkdir -p obj && touch obj/project.assets.json
+        ;;
+    publish)
+        for arg in "$@"; do
+            case "$arg" in
+                -p:PublishDir=*) mkdir -p "${arg#-p:PublishDir=}" && touch "${arg#-p:PublishDir=}/dummy.dll" ;;
+            esac
+        done
+        ;;
+esac
+"""
+
+PROJECT = """<Project Sdk="Microsoft.NET.Sdk">
+  <PropertyGroup>
+    <TargetFramework>net6.0</TargetFramework>
+    <Version>1.0.0.0</Version>
+  </PropertyGroup>
+</Project>
+"""
+
+
+@pytest.fixture
+def dotnet_shim(tmp_path_factory, monkeypatch) -> Path:
+    if sys.platform == "win32":
+        pytest.skip("dotnet shim is a shell script")
+
+    shim: Path = tmp_path_factory.mktemp("shim")
+    (shim / "dotnet").write_text(DOTNET_SHIM)
+    (shim / "dotnet").chmod(0o755)
+    log = shim / "dotnet.log"
+    log.write_text("")
+    monkeypatch.setenv("PATH", str(shim) + os.pathsep + os.environ["PATH"])
+    monkeypatch.setenv("DOTNET_SHIM_LOG", str(log))
+    return log
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "jprm.yaml",
+)
+def test_build_plugin_incremental(tmp_path_factory, datafiles: Path, dotnet_shim: Path):
+    plugin: Path = tmp_path_factory.mktemp("plugin")
+    bindir: Path = tmp_path_factory.mktemp("bin")
+    log = dotnet_shim
+
+    shutil.copy(datafiles / "jprm.yaml", plugin)
+    (plugin / "Plugin.csproj").write_text(PROJECT)
+    (plugin / "Plugin.cs").write_text("class Plugin {}")
+
+    def build(version="1.0", incremental=True):
+        log.write_text("")
+        phases = jprm.build_plugin(str(plugin), output=str(bindir), version=version, incremental=incremental)
+        commands = [line.split(" ")[:2] for line in log.read_text().splitlines()]
+        return phases, commands
+
+    phases, commands = build()
+    assert commands == [["clean", "--configuration=Release"], ["restore", "--no-cache"], ["publish", "--nologo"]]
+    assert phases["clean"] == "no previous build"
+    assert (bindir / "dummy.dll").exists()
+    assert (plugin / "obj" / "jprm-build.json").exists()
+
+    phases, commands = build()
+    assert commands == [["publish", "--nologo"]]
+    assert phases == {"clean": None, "restore": None, "publish": "always"}
+
+    # The version is not an input of restore
+    phases, commands = build(version="1.1")
+    assert commands == [["publish", "--nologo"]]
+
+    (plugin / "Plugin.cs").write_text("class Plugin { }")
+    phases, commands = build()
+    assert commands == [["clean", "--configuration=Release"], ["publish", "--nologo"]]
+    assert phases["clean"] == "`Plugin.cs` changed"
+
+    (plugin / "packages.lock.json").write_text("{}")
+    phases, commands = build()
+    assert commands == [["clean", "--configuration=Release"], ["restore"], ["publish", "--nologo"]]
+    assert phases["restore"] == "`packages.lock.json` added"
+
+    (plugin / "obj" / "project.assets.json").unlink()
+    phases, commands = build()
+    assert commands == [["restore"], ["publish", "--nologo"]]
+
+    phases, commands = build(incremental=False)
+    assert commands == [["clean", "--configuration=Release"], ["restore", "--no-cache"], ["publish", "--nologo"]]
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "jprm.yaml",
+)
+def test_build_plugin_incremental_props_version(tmp_path_factory, datafiles: Path, dotnet_shim: Path):
+    plugin: Path = tmp_path_factory.mktemp("plugin")
+    bindir: Path = tmp_path_factory.mktemp("bin")
+    log = dotnet_shim
+
+    shutil.copy(datafiles / "jprm.yaml", plugin)
+    (plugin / "Plugin.csproj").write_text(PROJECT.replace("    <Version>1.0.0.0</Version>\n", ""))
+    (plugin / "Directory.Build.props").write_text(
+        "<Project>\n"
+        "  <PropertyGroup>\n"
+        "    <Version>1.0.0.0</Version>\n"
+        "    <AssemblyVersion>1.0.0.0</AssemblyVersion>\n"
+        "    <FileVersion>1.0.0.0</FileVersion>\n"
+        "  </PropertyGroup>\n"
+        "</Project>\n"
+    )
+
+    jprm.build_plugin(str(plugin), output=str(bindir), version="1.0", incremental=True)
+
+    log.write_text("")
+    phases = jprm.build_plugin(str(plugin), output=str(bindir), version="1.1", incremental=True)
+    assert "<Version>1.1.0.0</Version>" in (plugin / "Directory.Build.props").read_text()
+    assert phases == {"clean": None, "restore": None, "publish": "always"}
+    assert [line.split(" ")[0] for line in log.read_text().splitlines()] == ["publish"]
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "jprm.yaml",
+)
+def test_build_many(cli_runner, tmp_path: Path, datafiles: Path, dotnet_shim: Path, monkeypatch):
+    config = (datafiles / "jprm.yaml").read_text()
+    monorepo = tmp_path / "monorepo"
+    for name, framework, config_file in (
+        ("Plugin A", "['net6.0', 'net8.0']", "jprm.yaml"),
+        ("Plugin B", "net6.0", ".ci/jprm.yaml"),
+        ("Plugin C", "net6.0", "build.yaml"),
+    ):
+        plugin = monorepo / "plugins" / name.replace(" ", "")
+        (plugin / config_file).parent.mkdir(parents=True)
+        (plugin / config_file).write_text(
+            config.replace("Plugin A", name).replace("'net6.0'", framework)
+        )
+        (plugin / "Plugin.csproj").write_text(PROJECT)
+    # Not a plugin
+    (monorepo / "docs").mkdir()
+    (monorepo / "docs" / "build.yaml").write_text("theme: dark\n")
+    (monorepo / "plugins" / "PluginC" / "FAIL").write_text("")
+
+    # jprm's own thread pools stay within each job's share of the budget too
+    zip_jobs = []
+    rewrite_jobs = []
+    zip_entries = jprm.zip_entries
+    rewrite_projects = jprm.rewrite_projects
+
+    def zip_entries_spy(*args, **kwargs):
+        zip_jobs.append(kwargs.get("jobs"))
+        return zip_entries(*args, **kwargs)
+
+    def rewrite_projects_spy(*args, **kwargs):
+        rewrite_jobs.append(kwargs.get("jobs"))
+        return rewrite_projects(*args, **kwargs)
+
+    monkeypatch.setattr(jprm, "zip_entries", zip_entries_spy)
+    monkeypatch.setattr(jprm, "rewrite_projects", rewrite_projects_spy)
+
+    output = tmp_path / "artifacts"
+    result = cli_runner.invoke(
+        jprm.cli,
+        ["plugin", "build-many", str(monorepo), "--output", str(output), "--cpu-budget", "4", "--jobs", "2"],
+    )
+    assert result.exit_code == 1
+
+    assert (output / "net6.0" / "plugin-a_1.0.0.0.zip").is_file()
+    assert (output / "net8.0" / "plugin-a_1.0.0.0.zip").is_file()
+    assert (output / "plugin-b_1.0.0.0.zip").is_file()
+    assert not (output / "plugin-c_1.0.0.0.zip").exists()
+
+    lines = result.output.splitlines()
+    lines = lines[next(i for i, line in enumerate(lines) if line.startswith("PLUGIN")):]
+    assert lines[0].split() == ["PLUGIN", "FRAMEWORK", "STATUS", "ARTIFACT", "DURATION"]
+    assert [line.split()[2:4] for line in lines[1:]] == [
+        ["net6.0", "OK"],
+        ["net8.0", "OK"],
+        ["net6.0", "OK"],
+        ["net6.0", "FAILED"],
+    ]
+
+    publish = [line for line in dotnet_shim.read_text().splitlines() if line.startswith("publish")]
+    assert len(publish) == 3
+    assert all(line.endswith("-maxcpucount:2") for line in publish)
+    assert zip_jobs == [2, 2, 2]
+    assert rewrite_jobs == [2, 2, 2, 2]
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "jprm.yaml",
+)
+def test_build_plugin_timings(cli_runner, tmp_path: Path, datafiles: Path, dotnet_shim: Path):
+    plugin = tmp_path / "plugin"
+    plugin.mkdir()
+    shutil.copy(datafiles / "jprm.yaml", plugin)
+    (plugin / "Plugin.csproj").write_text(PROJECT)
+    (tmp_path / "artifacts").mkdir()
+    timings_file = tmp_path / "timings.json"
+
+    result = cli_runner.invoke(
+        jprm.cli,
+        ["plugin", "build", str(plugin), "--output", str(tmp_path / "artifacts"),
+         "--timings", "--timings-json", str(timings_file)],
+    )
+    assert result.exit_code == 0
+    assert "PHASE" in result.output
+
+    timings = json_load(timings_file)
+    assert timings["plugin"] == "Plugin A"
+    assert [phase["phase"] for phase in timings["phases"]] == [
+        "config", "rewrite", "clean", "restore", "publish", "stage", "metadata", "zip", "checksum",
+    ]
+    assert timings["total"] == pytest.approx(sum(phase["wall"] for phase in timings["phases"]))
+    publish = timings["phases"][4]
+    if hasattr(os, "wait4"):
+        assert publish["cpu"] is not None
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "jprm.yaml",
+    TEST_DATA_DIR / "image.png",
+)
+def test_package_plugin_layout(tmp_path_factory, datafiles: Path):
+    bindir: Path = tmp_path_factory.mktemp("bin")
+    plugin: Path = tmp_path_factory.mktemp("plugin")
+    artifacts: Path = tmp_path_factory.mktemp("artifacts")
+
+    (bindir / "dummy.dll").write_text("dummy", "utf-8")
+    (bindir / "runtimes" / "linux-x64").mkdir(parents=True)
+    (bindir / "runtimes" / "linux-x64" / "native.so").write_bytes(b"\0" * 1000)
+    (bindir / "unlisted.dll").write_text("not packaged", "utf-8")
+
+    shutil.copy(datafiles / "image.png", plugin)
+    (plugin / "jprm.yaml").write_text(
+        (datafiles / "jprm.yaml").read_text().replace(
+            "- 'dummy.dll'\n", "- 'dummy.dll'\n- 'runtimes/linux-x64/native.so'\n"
+        )
+    )
+
+    output_path = Path(
+        jprm.package_plugin(
+            str(plugin), version="5.0", binary_path=str(bindir), output=str(artifacts)
+        )
+    )
+
+    with zipfile.ZipFile(output_path) as zf:
+        assert zf.testzip() is None
+        assert sorted(zf.namelist()) == [
+            "dummy.dll",
+            "image.png",
+            "meta.json",
+            "runtimes/",
+            "runtimes/linux-x64/",
+            "runtimes/linux-x64/native.so",
+        ]
+        assert zf.read("image.png") == (datafiles / "image.png").read_bytes()
+        meta = zf.read("meta.json")
+
+    assert (artifacts / "plugin-a_5.0.0.0.zip.meta.json").read_bytes() == meta
+    assert json.loads(meta)["image"] == "image.png"
+    assert jprm.read_checksum_file(str(output_path)) == jprm.checksum_file(str(output_path))
@@ -109,3 +109,74 @@ def test_repo_add(cli_runner: CliRunner, tmp_path: Path, datafiles: Path):
     assert manifest == manifest_ab
     assert (tmp_path / "plugin-b" / "plugin-b_1.0.0.0.zip").exists()
     assert (tmp_path / "plugin-b" / "image.png").exists()
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "pluginA_1.0.0.zip",
+    TEST_DATA_DIR / "pluginA_1.1.0.zip",
+    TEST_DATA_DIR / "pluginB_1.0.0.zip",
+    TEST_DATA_DIR / "manifest_pluginAB.json",
+)
+@pytest.mark.parametrize("jobs", ["1", "3"])
+def test_repo_add_multiple(jobs: str, cli_runner: CliRunner, tmp_path: Path, datafiles: Path):
+    manifest_file = tmp_path / "repo.json"
+    result = cli_runner.invoke(
+        jprm.cli, ["--verbosity=debug", "repo", "init", str(manifest_file)]
+    )
+    assert result.exit_code == 0
+
+    result = cli_runner.invoke(
+        jprm.cli,
+        [
+            "--verbosity=debug",
+            "repo",
+            "add",
+            "--jobs",
+            jobs,
+            str(manifest_file),
+            str(datafiles / "pluginA_1.0.0.zip"),
+            str(datafiles / "pluginA_1.1.0.zip"),
+            str(datafiles / "pluginB_1.0.0.zip"),
+        ],
+    )
+    assert result.exit_code == 0
+
+    assert json_load(manifest_file) == json_load(datafiles / "manifest_pluginAB.json")
+    assert sorted(p.name for p in (tmp_path / "plugin-a").iterdir()) == [
+        "plugin-a_1.0.0.0.zip",
+        "plugin-a_1.1.0.0.zip",
+    ]
+    assert sorted(p.name for p in (tmp_path / "plugin-b").iterdir()) == [
+        "image.png",
+        "plugin-b_1.0.0.0.zip",
+    ]
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "pluginA_1.0.0.zip",
+    TEST_DATA_DIR / "manifest_pluginA.json",
+)
+def test_repo_add_checksums(cli_runner: CliRunner, tmp_path: Path, datafiles: Path):
+    manifest_file = tmp_path / "repo.json"
+    cli_runner.invoke(jprm.cli, ["--verbosity=debug", "repo", "init", str(manifest_file)])
+
+    result = cli_runner.invoke(
+        jprm.cli,
+        [
+            "--verbosity=debug",
+            "repo",
+            "add",
+            "--checksum",
+            "sha256",
+            str(manifest_file),
+            str(datafiles / "pluginA_1.0.0.zip"),
+        ],
+    )
+    assert result.exit_code == 0
+
+    plugin_zip = tmp_path / "plugin-a" / "plugin-a_1.0.0.0.zip"
+    manifest_a = json_load(datafiles / "manifest_pluginA.json")
+    manifest_a[0]["versions"][0]["checksums"] = {
+        "sha256": jprm.checksum_file(plugin_zip, "sha256"),
+    }
+    assert json_load(manifest_file) == manifest_a
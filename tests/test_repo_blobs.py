@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import zipfile
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+import jprm
+
+from .test_utils import TEST_DATA_DIR
+
+
+def make_release(source: Path, target: Path, version: str):
+    # Same plugin, image and all, as another version
+    with zipfile.ZipFile(source) as zsrc, zipfile.ZipFile(target, "w") as zdst:
+        for info in zsrc.infolist():
+            data = zsrc.read(info)
+            if info.filename == jprm.JSON_METADATA_FILE:
+                meta = json.loads(data)
+                meta["version"] = version
+                data = json.dumps(meta).encode()
+            zdst.writestr(info, data)
+
+
+def init_repo(cli_runner: CliRunner, repo: Path, blobs: str) -> Path:
+    repo.mkdir()
+    (repo / jprm.REPO_CONFIG_FILE).write_text("blobs: {}\n".format(blobs))
+    manifest_file = repo / "manifest.json"
+    result = cli_runner.invoke(jprm.cli, ["repo", "init", str(manifest_file)])
+    assert result.exit_code == 0
+    return manifest_file
+
+
+def repo_add(cli_runner: CliRunner, manifest_file: Path, *plugins: Path):
+    result = cli_runner.invoke(
+        jprm.cli,
+        ["--verbosity=debug", "repo", "add", str(manifest_file), *map(str, plugins)],
+    )
+    assert result.exit_code == 0
+    return result
+
+
+def blobs(repo: Path):
+    return sorted(p.name for p in (repo / jprm.BLOB_STORE_DIR).rglob("*") if p.is_file())
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "pluginB_1.0.0.zip",
+)
+def test_repo_blobs_all(cli_runner: CliRunner, tmp_path: Path, datafiles: Path):
+    plugin_b = datafiles / "pluginB_1.0.0.zip"
+    plugin_b2 = datafiles / "pluginB_1.1.0.zip"
+    make_release(plugin_b, plugin_b2, "1.1.0.0")
+
+    repo = tmp_path / "repo"
+    manifest_file = init_repo(cli_runner, repo, "all")
+    repo_add(cli_runner, manifest_file, plugin_b, plugin_b2)
+
+    store = jprm.BlobStore(str(repo))
+    image = (repo / "plugin-b" / "image.png").read_bytes()
+    image_digest = hashlib.sha256(image).hexdigest()
+    archive_digests = [
+        jprm.checksum_file(str(plugin), "sha256") for plugin in (plugin_b, plugin_b2)
+    ]
+
+    assert blobs(repo) == sorted([image_digest] + archive_digests)
+    assert os.path.samefile(store.blob_path(image_digest), repo / "plugin-b" / "image.png")
+    assert os.path.samefile(store.blob_path(archive_digests[0]), repo / "plugin-b" / "plugin-b_1.0.0.0.zip")
+    assert os.path.samefile(store.blob_path(archive_digests[1]), repo / "plugin-b" / "plugin-b_1.1.0.0.zip")
+    # Only what was asked for goes in the manifest
+    assert all("checksums" not in release for release in json.loads(manifest_file.read_text())[0]["versions"])
+
+    # Adding the same content again links the existing blobs
+    result = repo_add(cli_runner, manifest_file, plugin_b)
+    assert "Existing image same as new" in result.output
+    assert blobs(repo) == sorted([image_digest] + archive_digests)
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "pluginA_1.0.0.zip",
+    TEST_DATA_DIR / "pluginB_1.0.0.zip",
+)
+def test_repo_blobs_images(cli_runner: CliRunner, tmp_path: Path, datafiles: Path):
+    repo = tmp_path / "repo"
+    manifest_file = init_repo(cli_runner, repo, "images")
+    repo_add(cli_runner, manifest_file, datafiles / "pluginA_1.0.0.zip", datafiles / "pluginB_1.0.0.zip")
+
+    image_digest = jprm.checksum_file(str(repo / "plugin-b" / "image.png"), "sha256")
+    assert blobs(repo) == [image_digest]
+    assert (repo / "plugin-b" / "plugin-b_1.0.0.0.zip").stat().st_nlink == 1
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "pluginB_1.0.0.zip",
+)
+def test_repo_image_unchanged(cli_runner: CliRunner, tmp_path: Path, datafiles: Path):
+    repo = tmp_path / "repo"
+    manifest_file = init_repo(cli_runner, repo, "none")
+    repo_add(cli_runner, manifest_file, datafiles / "pluginB_1.0.0.zip")
+
+    image = repo / "plugin-b" / "image.png"
+    inode = image.stat().st_ino
+
+    result = repo_add(cli_runner, manifest_file, datafiles / "pluginB_1.0.0.zip")
+    assert "Existing image same as new" in result.output
+    assert image.stat().st_ino == inode
+    assert not (repo / jprm.BLOB_STORE_DIR).exists()
+
+    image.write_bytes(b"not the image")
+    result = repo_add(cli_runner, manifest_file, datafiles / "pluginB_1.0.0.zip")
+    assert "Writing image" in result.output
+    with zipfile.ZipFile(datafiles / "pluginB_1.0.0.zip") as zf:
+        assert image.read_bytes() == zf.read("image.png")
@@ -0,0 +1,69 @@
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+import jprm
+
+from .test_utils import GUID_A, TEST_DATA_DIR, invoke_repo, json_load, make_repo
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "pluginA_1.0.0.zip",
+    TEST_DATA_DIR / "pluginA_1.1.0.zip",
+    TEST_DATA_DIR / "pluginB_1.0.0.zip",
+    TEST_DATA_DIR / "manifest_pluginAB.json",
+    TEST_DATA_DIR / "manifest_pluginAB2.json",
+)
+def test_repo_journal(cli_runner: CliRunner, tmp_path: Path, datafiles: Path):
+    manifest_file = make_repo(cli_runner, tmp_path / "manifest.json", journal=True)
+    journal = jprm.RepositoryJournal(str(manifest_file))
+
+    invoke_repo(cli_runner, "add", manifest_file, datafiles / "pluginA_1.0.0.zip")
+    invoke_repo(cli_runner, "add", manifest_file, datafiles / "pluginA_1.1.0.zip", datafiles / "pluginB_1.0.0.zip")
+
+    # Mutations only go to the journal, readers see them applied
+    assert json_load(manifest_file) == []
+    assert len(journal.read()[0]) == 3
+    assert jprm.load_repository(str(manifest_file)).manifest == json_load(datafiles / "manifest_pluginAB.json")
+    assert invoke_repo(cli_runner, "list", manifest_file, "plugin-a").stdout.split() == ["1.1.0.0", "1.0.0.0"]
+
+    result = invoke_repo(cli_runner, "remove", manifest_file, "plugin-a", "1.0")
+    assert "removed {} 1.0.0.0".format(GUID_A) in result.stdout.splitlines()
+
+    invoke_repo(cli_runner, "compact", manifest_file)
+    assert not journal.exists()
+    assert json_load(manifest_file) == json_load(datafiles / "manifest_pluginAB2.json")
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "pluginA_1.0.0.zip",
+    TEST_DATA_DIR / "manifest_pluginA.json",
+)
+def test_repo_journal_threshold(cli_runner: CliRunner, tmp_path: Path, datafiles: Path):
+    manifest_file = make_repo(cli_runner, tmp_path / "manifest.json", journal=True, journal_max_size=1)
+
+    invoke_repo(cli_runner, "add", manifest_file, datafiles / "pluginA_1.0.0.zip")
+
+    assert not jprm.RepositoryJournal(str(manifest_file)).exists()
+    assert json_load(manifest_file) == json_load(datafiles / "manifest_pluginA.json")
+
+
+def test_repo_journal_torn_write(tmp_path: Path):
+    manifest_file = tmp_path / "manifest.json"
+    manifest_file.write_text("[]")
+    journal = jprm.RepositoryJournal(str(manifest_file))
+
+    plugin = {"guid": GUID_A, "name": "Plugin A", "versions": []}
+    journal.append([{"op": "add", "plugin": plugin}])
+    with open(journal.path, "ab") as fh:
+        fh.write(b'{"op": "add", "plu')
+
+    operations, offset = journal.read()
+    assert len(operations) == 1
+
+    journal.append([{"op": "remove", "plugin": plugin["guid"]}])
+    operations, offset = journal.read()
+    assert [op["op"] for op in operations] == ["add", "remove"]
+
+    journal.truncate(offset)
+    assert not journal.exists()
@@ -0,0 +1,65 @@
+import threading
+import uuid
+from pathlib import Path
+
+import pytest
+import jprm
+
+from .test_utils import json_load
+
+
+def test_file_lock(tmp_path: Path):
+    lock_file = str(tmp_path / "repo.lock")
+
+    with jprm.FileLock(lock_file):
+        other = jprm.FileLock(lock_file)
+        assert other.acquire(blocking=False) is False
+
+    other = jprm.FileLock(lock_file)
+    assert other.acquire(blocking=False) is True
+    other.release()
+
+
+def plugin_manifest(i: int) -> dict:
+    return {
+        "guid": str(uuid.UUID(int=i + 1)),
+        "name": f"Plugin {i}",
+        "versions": [{"version": "1.0.0.0", "checksum": "0" * 32}],
+    }
+
+
+@pytest.mark.parametrize("coalesce", [False, True])
+def test_concurrent_commits(coalesce: bool, tmp_path: Path):
+    manifest_file = tmp_path / "manifest.json"
+    manifest_file.write_text("[]")
+    repo_path = str(manifest_file)
+
+    count = 16
+    start = threading.Barrier(count + 1)
+    errors = []
+
+    def writer(i):
+        start.wait()
+        try:
+            jprm.commit_repository_operations(
+                repo_path, [{"op": "add", "plugin": plugin_manifest(i)}], coalesce=coalesce
+            )
+        except Exception as e:  # pragma: no cover
+            errors.append(e)
+
+    # Hold the lock while the writers queue up, so they all contend for it
+    lock = jprm.repository_lock(repo_path)
+    lock.acquire()
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    lock.release()
+
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    manifest = json_load(manifest_file)
+    assert sorted(entry["name"] for entry in manifest) == sorted(f"Plugin {i}" for i in range(count))
+    assert not jprm.RepositoryJournal(repo_path).exists()
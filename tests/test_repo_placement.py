@@ -0,0 +1,107 @@
+import os
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+import jprm
+
+from .test_utils import TEST_DATA_DIR, json_load
+
+
+@pytest.mark.parametrize("placement, expected", [
+    ("copy", {"copy"}),
+    ("hardlink", {"hardlink"}),
+    ("reflink", {"reflink", "copy"}),
+    ("auto", {"reflink", "hardlink"}),
+])
+def test_place_file(tmp_path: Path, placement: str, expected: set):
+    src = tmp_path / "src.bin"
+    src.write_bytes(os.urandom(65536))
+    dst = tmp_path / "dst.bin"
+
+    method = jprm.place_file(str(src), str(dst), placement)
+
+    assert method in expected
+    assert dst.read_bytes() == src.read_bytes()
+    assert os.path.samefile(src, dst) == (method == "hardlink")
+
+
+def test_place_file_unknown(tmp_path: Path):
+    with pytest.raises(ValueError):
+        jprm.place_file(str(tmp_path / "src"), str(tmp_path / "dst"), "teleport")
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "pluginA_1.0.0.zip",
+    TEST_DATA_DIR / "pluginB_1.0.0.zip",
+)
+@pytest.mark.parametrize("cache", ["--cache", "--no-cache"])
+def test_repo_add_hardlink(cli_runner: CliRunner, tmp_path: Path, datafiles: Path, cache: str):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    (repo / jprm.REPO_CONFIG_FILE).write_text("placement: hardlink\n")
+    manifest_file = repo / "manifest.json"
+
+    result = cli_runner.invoke(jprm.cli, ["repo", "init", str(manifest_file)])
+    assert result.exit_code == 0
+
+    result = cli_runner.invoke(
+        jprm.cli,
+        ["--verbosity=debug", "repo", "add", cache, str(manifest_file),
+         str(datafiles / "pluginA_1.0.0.zip"), str(datafiles / "pluginB_1.0.0.zip")],
+    )
+    assert result.exit_code == 0
+
+    manifest = json_load(manifest_file)
+    assert [(entry["name"], entry["versions"][0]["checksum"]) for entry in manifest] == [
+        ("Plugin A", jprm.checksum_file(str(datafiles / "pluginA_1.0.0.zip"))),
+        ("Plugin B", jprm.checksum_file(str(datafiles / "pluginB_1.0.0.zip"))),
+    ]
+    assert os.path.samefile(datafiles / "pluginA_1.0.0.zip", repo / "plugin-a" / "plugin-a_1.0.0.0.zip")
+    assert os.path.samefile(datafiles / "pluginB_1.0.0.zip", repo / "plugin-b" / "plugin-b_1.0.0.0.zip")
+
+    # The command line overrides the repository setting
+    result = cli_runner.invoke(
+        jprm.cli,
+        ["repo", "add", "--placement", "copy", str(manifest_file), str(datafiles / "pluginA_1.0.0.zip")],
+    )
+    assert result.exit_code == 0
+    assert not os.path.samefile(datafiles / "pluginA_1.0.0.zip", repo / "plugin-a" / "plugin-a_1.0.0.0.zip")
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "jprm.yaml",
+)
+def test_repackage_after_hardlink(cli_runner: CliRunner, tmp_path: Path, datafiles: Path):
+    bindir = tmp_path / "bin"
+    bindir.mkdir()
+    (bindir / "dummy.dll").write_text("first build", "utf-8")
+    artifacts = tmp_path / "artifacts"
+    artifacts.mkdir()
+
+    artifact = Path(jprm.package_plugin(str(datafiles), binary_path=str(bindir), output=str(artifacts)))
+    md5sum = Path(str(artifact) + ".md5sum").read_bytes()
+
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    (repo / jprm.REPO_CONFIG_FILE).write_text("placement: hardlink\n")
+    manifest_file = repo / "manifest.json"
+    assert cli_runner.invoke(jprm.cli, ["repo", "init", str(manifest_file)]).exit_code == 0
+    assert cli_runner.invoke(jprm.cli, ["repo", "add", str(manifest_file), str(artifact)]).exit_code == 0
+
+    published = repo / "plugin-a" / artifact.name
+    assert os.path.samefile(artifact, published)
+    contents = published.read_bytes()
+
+    # Rebuilding the artifact replaces it, instead of rewriting the published archive through the link
+    (bindir / "dummy.dll").write_text("second build", "utf-8")
+    jprm.package_plugin(str(datafiles), binary_path=str(bindir), output=str(artifacts))
+
+    assert not os.path.samefile(artifact, published)
+    assert artifact.read_bytes() != contents
+    assert Path(str(artifact) + ".md5sum").read_bytes() != md5sum
+    assert published.read_bytes() == contents
+    assert json_load(manifest_file)[0]["versions"][0]["checksum"] == jprm.checksum_file(str(published))
+    assert sorted(p.name for p in artifacts.iterdir()) == [
+        artifact.name, artifact.name + ".md5sum", artifact.name + ".meta.json",
+    ]
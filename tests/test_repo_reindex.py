@@ -0,0 +1,116 @@
+import json
+import shutil
+import zipfile
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+import jprm
+
+from .test_utils import TEST_DATA_DIR, invoke_repo, json_load, make_repo
+
+
+REPO_URL = "https://repo.example.com/jellyfin"
+
+
+ADD_ARGS = ("--url", REPO_URL, "-c", "sha256")
+PLUGIN_ZIPS = ("pluginA_1.0.0.zip", "pluginB_1.0.0.zip", "pluginA_1.1.0.zip")
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "pluginA_1.0.0.zip",
+    TEST_DATA_DIR / "pluginA_1.1.0.zip",
+    TEST_DATA_DIR / "pluginB_1.0.0.zip",
+)
+@pytest.mark.parametrize("jobs", ["1", "3"])
+@pytest.mark.parametrize("cache", ["--cache", "--no-cache"])
+def test_repo_reindex(cli_runner: CliRunner, tmp_path: Path, datafiles: Path, jobs: str, cache: str):
+    manifest_file = tmp_path / "repo" / "manifest.json"
+    make_repo(cli_runner, manifest_file, *(datafiles / name for name in PLUGIN_ZIPS), args=ADD_ARGS)
+    expected = json_load(manifest_file)
+
+    manifest_file.write_text("[{")
+    # Not where its metadata says it belongs
+    shutil.copy(datafiles / "pluginB_1.0.0.zip", tmp_path / "repo" / "plugin-a" / "plugin-a_9.0.0.0.zip")
+
+    result = cli_runner.invoke(
+        jprm.cli,
+        ["--verbosity=debug", "repo", "reindex", "--url", REPO_URL, "-c", "sha256", "-j", jobs, cache,
+         str(manifest_file)],
+    )
+    assert result.exit_code == 0
+    assert json_load(manifest_file) == expected
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "pluginA_1.0.0.zip",
+    TEST_DATA_DIR / "pluginA_1.1.0.zip",
+    TEST_DATA_DIR / "pluginB_1.0.0.zip",
+)
+def test_repo_reindex_discards_journal(cli_runner: CliRunner, tmp_path: Path, datafiles: Path):
+    manifest_file = tmp_path / "manifest.json"
+    make_repo(cli_runner, manifest_file, *(datafiles / name for name in PLUGIN_ZIPS), args=ADD_ARGS)
+    expected = json_load(manifest_file)
+
+    manifest_file.unlink()
+    jprm.RepositoryJournal(str(manifest_file)).append([
+        {"op": "remove", "plugin": expected[0]["guid"]},
+    ])
+
+    jprm.reindex_repository(str(manifest_file), repo_url=REPO_URL, checksum_types=("sha256",))
+
+    assert json_load(manifest_file) == expected
+    assert jprm.load_repository(str(manifest_file)).manifest == expected
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "pluginA_1.0.0.zip",
+    TEST_DATA_DIR / "pluginA_1.1.0.zip",
+    TEST_DATA_DIR / "pluginB_1.0.0.zip",
+)
+def test_repo_reindex_keeps_later_journal(cli_runner: CliRunner, tmp_path: Path, datafiles: Path, monkeypatch):
+    manifest_file = tmp_path / "manifest.json"
+    make_repo(cli_runner, manifest_file, *(datafiles / name for name in PLUGIN_ZIPS), args=ADD_ARGS)
+    expected = json_load(manifest_file)
+
+    # Another process journals an operation while the archives are being read
+    find_repository_archives = jprm.find_repository_archives
+
+    def find_and_journal(repo_dir):
+        archives = find_repository_archives(repo_dir)
+        jprm.RepositoryJournal(str(manifest_file)).append([
+            {"op": "remove", "plugin": expected[1]["guid"]},
+        ])
+        return archives
+
+    monkeypatch.setattr(jprm, "find_repository_archives", find_and_journal)
+    jprm.reindex_repository(str(manifest_file), repo_url=REPO_URL, checksum_types=("sha256",))
+
+    assert json_load(manifest_file) == expected
+    assert jprm.load_repository(str(manifest_file)).manifest == expected[:1]
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "pluginA_1.0.0.zip",
+)
+def test_repo_reindex_newest_metadata(cli_runner: CliRunner, tmp_path: Path, datafiles: Path):
+    # 10.0.0.0 sorts before 9.0.0.0 by path, but its metadata is the newest
+    zips = []
+    for version, description in (("9.0.0.0", "old description"), ("10.0.0.0", "new description")):
+        filename = tmp_path / "pluginA_{}.zip".format(version)
+        with zipfile.ZipFile(datafiles / "pluginA_1.0.0.zip") as src, zipfile.ZipFile(filename, "w") as dst:
+            meta = json.loads(src.read("meta.json"))
+            meta.update(version=version, description=description)
+            dst.writestr("meta.json", json.dumps(meta))
+            dst.writestr("dummy.dll", src.read("dummy.dll"))
+        zips.append(str(filename))
+
+    manifest_file = make_repo(cli_runner, tmp_path / "repo" / "manifest.json")
+    for filename in zips:
+        invoke_repo(cli_runner, "add", "--url", REPO_URL, manifest_file, filename)
+    expected = json_load(manifest_file)
+    assert expected[0]["description"] == "new description"
+
+    jprm.reindex_repository(str(manifest_file), repo_url=REPO_URL)
+
+    assert json_load(manifest_file) == expected
@@ -0,0 +1,68 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+import jprm
+
+from .test_utils import GUID_A, GUID_B, TEST_DATA_DIR, invoke_repo, json_load
+
+
+def test_sharded_manifest_encoding(tmp_path: Path):
+    manifest = [
+        {"guid": GUID_A, "name": "Plugin A", "description": "Ünïcödé\nlines", "versions": []},
+        {"guid": GUID_B, "name": "Plugin B", "versions": [{"version": "1.0.0.0"}]},
+    ]
+    manifest_file = tmp_path / "manifest.json"
+
+    storage = jprm.ShardedManifest(str(manifest_file))
+    jprm.save_repository(str(manifest_file), jprm.RepositoryIndex(list(manifest), storage=storage))
+
+    assert manifest_file.read_text() == json.dumps(manifest, indent=4)
+    assert json_load(tmp_path / "plugin-a" / f"{GUID_A}.json") == manifest[0]
+    assert json_load(tmp_path / "manifest.json.shards") == [
+        f"plugin-a/{GUID_A}.json",
+        f"plugin-b/{GUID_B}.json",
+    ]
+
+    repository = jprm.ShardedManifest(str(manifest_file)).load()
+    assert repository.manifest == manifest
+
+    repository.remove(repository.get("plugin-a"))
+    repository.remove(repository.get("plugin-b"))
+    jprm.save_repository(str(manifest_file), repository)
+
+    assert manifest_file.read_text() == "[]"
+    assert not (tmp_path / "plugin-a" / f"{GUID_A}.json").exists()
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "pluginA_1.0.0.zip",
+    TEST_DATA_DIR / "pluginA_1.1.0.zip",
+    TEST_DATA_DIR / "pluginB_1.0.0.zip",
+    TEST_DATA_DIR / "manifest_pluginAB.json",
+    TEST_DATA_DIR / "manifest_pluginB.json",
+)
+def test_repo_sharded(cli_runner: CliRunner, tmp_path: Path, datafiles: Path):
+    manifest_file = tmp_path / "manifest.json"
+    invoke_repo(cli_runner, "init", "--layout", "sharded", tmp_path)
+    assert jprm.get_repo_config(str(manifest_file)) == {"layout": "sharded"}
+    assert manifest_file.read_text() == "[]"
+
+    invoke_repo(cli_runner, "add", manifest_file, datafiles / "pluginA_1.0.0.zip", datafiles / "pluginB_1.0.0.zip")
+
+    # Only the shard of the plugin that changed is rewritten
+    shard_b = tmp_path / "plugin-b" / f"{GUID_B}.json"
+    os.utime(shard_b, ns=(0, 0))
+    invoke_repo(cli_runner, "add", manifest_file, datafiles / "pluginA_1.1.0.zip")
+    assert shard_b.stat().st_mtime_ns == 0
+
+    expected = json_load(datafiles / "manifest_pluginAB.json")
+    assert manifest_file.read_text() == json.dumps(expected, indent=4)
+    assert json_load(tmp_path / "plugin-a" / f"{GUID_A}.json") == expected[0]
+
+    invoke_repo(cli_runner, "remove", manifest_file, "plugin-a")
+    assert json_load(manifest_file) == json_load(datafiles / "manifest_pluginB.json")
+    assert not (tmp_path / "plugin-a" / f"{GUID_A}.json").exists()
+    assert shard_b.stat().st_mtime_ns == 0
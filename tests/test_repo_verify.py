@@ -0,0 +1,141 @@
+import json
+import zipfile
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+import jprm
+
+from .test_utils import TEST_DATA_DIR, invoke_repo, make_repo
+
+
+def repo_verify(cli_runner: CliRunner, manifest_file: Path, *args: str):
+    return cli_runner.invoke(
+        jprm.cli,
+        ["--verbosity=debug", "repo", "verify", str(manifest_file), *args],
+    )
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "pluginA_1.0.0.zip",
+    TEST_DATA_DIR / "pluginA_1.1.0.zip",
+    TEST_DATA_DIR / "pluginB_1.0.0.zip",
+)
+@pytest.mark.parametrize("jobs", ["1", "3"])
+def test_repo_verify(cli_runner: CliRunner, tmp_path: Path, datafiles: Path, jobs: str):
+    manifest_file = make_repo(
+        cli_runner, tmp_path / "repo" / "manifest.json",
+        datafiles / "pluginA_1.0.0.zip", datafiles / "pluginA_1.1.0.zip", datafiles / "pluginB_1.0.0.zip",
+        args=("-c", "sha256"),
+    )
+    repo_dir = manifest_file.parent
+
+    result = repo_verify(cli_runner, manifest_file, "--jobs", jobs)
+    assert result.exit_code == 0
+
+    (repo_dir / "plugin-a" / "plugin-a_1.0.0.0.zip").unlink()
+
+    archive = repo_dir / "plugin-a" / "plugin-a_1.1.0.0.zip"
+    data = bytearray(archive.read_bytes())
+    data[60] ^= 0xFF
+    archive.write_bytes(bytes(data))
+
+    result = repo_verify(cli_runner, manifest_file, "--jobs", jobs)
+    assert result.exit_code == 1
+    assert "MISSING" in result.output
+    assert "MISMATCH" in result.output
+    assert "Plugin B" not in result.output
+
+    statuses = [
+        (status, release["version"])
+        for status, _detail, _entry, release, _path in jprm.verify_repository(str(manifest_file))
+    ]
+    assert statuses == [("mismatch", "1.1.0.0"), ("missing", "1.0.0.0"), ("ok", "1.0.0.0")]
+
+
+@pytest.mark.datafiles(TEST_DATA_DIR / "pluginB_1.0.0.zip")
+def test_verify_archive_corrupt(tmp_path: Path, datafiles: Path):
+    archive = datafiles / "pluginB_1.0.0.zip"
+    with zipfile.ZipFile(archive) as zf:
+        info = zf.infolist()[0]
+    data = bytearray(archive.read_bytes())
+    # Flip a byte of the first entry's data, past its local header
+    offset = info.header_offset + 30 + len(info.filename.encode()) + len(info.extra)
+    data[offset] ^= 0xFF
+    archive.write_bytes(bytes(data))
+
+    checksums = jprm.checksum_file_multi(str(archive), ("md5",))
+    status, detail = jprm.verify_archive(str(archive), checksums)
+    assert status == "corrupt"
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "pluginA_1.0.0.zip",
+    TEST_DATA_DIR / "pluginA_1.1.0.zip",
+    TEST_DATA_DIR / "pluginB_1.0.0.zip",
+)
+def test_repo_verify_incremental(cli_runner: CliRunner, tmp_path: Path, datafiles: Path):
+    manifest_file = make_repo(
+        cli_runner, tmp_path / "repo" / "manifest.json",
+        datafiles / "pluginA_1.0.0.zip", datafiles / "pluginA_1.1.0.zip", datafiles / "pluginB_1.0.0.zip",
+        args=("-c", "sha256"),
+    )
+
+    with jprm.ArchiveCache.for_repo(str(manifest_file)) as cache:
+        results = jprm.verify_repository(str(manifest_file), cache=cache, incremental=True)
+        assert [r[0] for r in results] == ["ok", "ok", "ok"]
+
+        results = jprm.verify_repository(str(manifest_file), cache=cache, incremental=True)
+        assert [r[0] for r in results] == ["skipped", "skipped", "skipped"]
+
+        archive = manifest_file.parent / "plugin-b" / "plugin-b_1.0.0.0.zip"
+        archive.write_bytes(archive.read_bytes() + b"\0")
+
+        results = jprm.verify_repository(str(manifest_file), cache=cache, incremental=True)
+        assert [r[0] for r in results] == ["skipped", "skipped", "mismatch"]
+
+    result = repo_verify(cli_runner, manifest_file, "--incremental")
+    assert result.exit_code == 1
+
+
+@pytest.mark.datafiles(TEST_DATA_DIR / "pluginA_1.0.0.zip")
+def test_repo_verify_renamed(cli_runner: CliRunner, tmp_path: Path, datafiles: Path):
+    renamed = tmp_path / "renamed.zip"
+    with zipfile.ZipFile(datafiles / "pluginA_1.0.0.zip") as src, zipfile.ZipFile(renamed, "w") as dst:
+        meta = json.loads(src.read("meta.json"))
+        meta.update(name="Plugin Renamed", version="2.0.0.0")
+        dst.writestr("meta.json", json.dumps(meta))
+        dst.writestr("dummy.dll", src.read("dummy.dll"))
+
+    manifest_file = make_repo(cli_runner, tmp_path / "repo" / "manifest.json", datafiles / "pluginA_1.0.0.zip")
+    invoke_repo(cli_runner, "add", manifest_file, renamed)
+
+    # The release from before the rename is still under the old slug
+    results = jprm.verify_repository(str(manifest_file))
+    assert [(status, release["version"], Path(path).parent.name) for status, _detail, _entry, release, path in results] == [
+        ("ok", "2.0.0.0", "plugin-renamed"),
+        ("ok", "1.0.0.0", "plugin-a"),
+    ]
+
+    (manifest_file.parent / "plugin-a" / "plugin-a_1.0.0.0.zip").unlink()
+    result = repo_verify(cli_runner, manifest_file)
+    assert result.exit_code == 1
+    assert "MISSING" in result.output
+
+
+def test_local_archive_path(tmp_path: Path):
+    entry = {"name": "Plugin A"}
+
+    def release(url):
+        return {"version": "1.0.0.0", "sourceUrl": url}
+
+    assert jprm.local_archive_path(str(tmp_path), entry, release("https://repo.example.com/plugin-a/plugin-a_1.0.0.0.zip")) == str(
+        tmp_path / "plugin-a" / "plugin-a_1.0.0.0.zip"
+    )
+    assert jprm.local_archive_path(str(tmp_path), entry, release("/old-name/old-name_1.0.0.0.zip")) == str(
+        tmp_path / "old-name" / "old-name_1.0.0.0.zip"
+    )
+    # Hosted elsewhere
+    assert jprm.local_archive_path(str(tmp_path), entry, release("https://github.com/a/b/releases/download/v1.0/plugin-a.zip")) is None
+    assert jprm.local_archive_path(str(tmp_path), entry, release("https://example.com/../../etc/passwd")) is None
+    assert jprm.local_archive_path(str(tmp_path), entry, release("")) is None
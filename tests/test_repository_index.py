@@ -0,0 +1,78 @@
+import copy
+import uuid
+from pathlib import Path
+
+import pytest
+import jprm
+
+from .test_utils import GUID_A, GUID_B, TEST_DATA_DIR, json_load
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "manifest_pluginAB.json",
+)
+def test_repository_index_get(datafiles: Path):
+    index = jprm.RepositoryIndex(json_load(datafiles / "manifest_pluginAB.json"))
+
+    assert len(index) == 2
+    for key in [GUID_A, GUID_A.upper(), uuid.UUID(GUID_A), "Plugin A", "plugin-a"]:
+        assert index.get(key)["guid"] == GUID_A
+        assert jprm.get_plugin_from_manifest(index.manifest, key)["guid"] == GUID_A
+
+    assert index.get("plugin-b")["guid"] == GUID_B
+    assert index.get("plugin-c") is None
+    assert index.get(None) is None
+
+
+def test_repository_index_first_match_wins():
+    # The name of the first plugin is the slug of the second one
+    manifest = [
+        {"guid": GUID_A, "name": "plugin-b", "versions": []},
+        {"guid": GUID_B, "name": "Plugin B", "versions": []},
+    ]
+    index = jprm.RepositoryIndex(manifest)
+
+    assert index.get("plugin-b") is manifest[0]
+    assert index.get("Plugin B") is manifest[1]
+
+    index.remove(manifest[0])
+    assert index.get("plugin-b")["guid"] == GUID_B
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "manifest_pluginA.json",
+    TEST_DATA_DIR / "manifest_pluginAB.json",
+)
+def test_repository_index_merge(datafiles: Path):
+    manifest_a = json_load(datafiles / "manifest_pluginA.json")
+    manifest_ab = json_load(datafiles / "manifest_pluginAB.json")
+    index = jprm.RepositoryIndex(copy.deepcopy(manifest_a))
+
+    plugin_b = copy.deepcopy(manifest_ab[1])
+    assert index.merge(plugin_b) == [plugin_b]
+    assert index.get("plugin-b") is plugin_b
+
+    renamed = copy.deepcopy(manifest_a[0])
+    renamed["name"] = "Plugin C"
+    renamed["versions"][0]["version"] = "1.1.0.0"
+    index.merge(renamed)
+
+    assert len(index) == 2
+    assert index.get("Plugin A") is None
+    assert index.get("plugin-a") is None
+    assert index.get("plugin-c")["guid"] == GUID_A
+    assert [v["version"] for v in index.get(GUID_A)["versions"]] == ["1.1.0.0", "1.0.0.0"]
+
+
+def test_repository_index_merge_keeps_order():
+    manifest = [
+        {"guid": GUID_A, "name": "X", "versions": [{"version": "1.0.0.0"}]},
+        {"guid": GUID_B, "name": "X", "versions": [{"version": "1.0.0.0"}]},
+    ]
+    index = jprm.RepositoryIndex(manifest)
+
+    index.merge({"guid": GUID_A, "name": "X", "versions": [{"version": "1.1.0.0"}]})
+
+    assert index.get("X") is manifest[0]
+    assert index.get("x") is manifest[0]
+    assert [v["version"] for v in index.get("X")["versions"]] == ["1.1.0.0", "1.0.0.0"]
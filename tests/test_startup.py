@@ -0,0 +1,37 @@
+import json
+import os
+import subprocess
+import sys
+
+import jprm
+
+# Imported on first use, by the commands that need them
+LAZY_MODULES = (
+    "concurrent.futures",
+    "shutil",
+    "slugify",
+    "sqlite3",
+    "subprocess",
+    "tabulate",
+    "tempfile",
+    "yaml",
+    "zipfile",
+)
+
+
+def test_import_is_lazy():
+    code = "import json, sys, jprm; print(json.dumps(sorted(set(sys.modules).intersection({!r}))))".format(
+        LAZY_MODULES
+    )
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    output = subprocess.run(
+        [sys.executable, "-c", code], env=env, check=True, stdout=subprocess.PIPE
+    ).stdout
+
+    assert json.loads(output) == []
+
+
+def test_lazy_module():
+    module = jprm._LazyModule("concurrent.futures")
+    assert module.futures.ThreadPoolExecutor is sys.modules["concurrent.futures"].ThreadPoolExecutor
+    assert jprm.slugify("Kodi Sync Queue") == "kodi-sync-queue"
@@ -0,0 +1,63 @@
+import copy
+import random
+
+import pytest
+import jprm
+
+
+def reference_update_plugin_manifest(old, new):
+    # update_plugin_manifest as of jprm 1.1.0
+    new_versions = new.pop("versions")
+    old_versions = old.pop("versions")
+
+    new_version_numbers = [x["version"] for x in new_versions]
+
+    old.update(new)
+
+    old["versions"] = []
+
+    while old_versions:
+        ver = old_versions.pop(0)
+        ver["version"] = jprm.Version(ver["version"]).full()
+
+        if ver["version"] not in new_version_numbers:
+            old["versions"].append(ver)
+
+    while new_versions:
+        ver = new_versions.pop(0)
+        old["versions"].append(ver)
+
+    old["versions"].sort(key=lambda v: jprm.Version(v["version"]), reverse=True)
+    return old
+
+
+def random_version(rng: random.Random, large: bool) -> str:
+    parts = [rng.randrange(3) for _ in range(rng.randrange(1, 5))]
+    if large and rng.random() < 0.2:
+        parts[-1] = 70000
+    return ".".join(map(str, parts))
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_update_plugin_manifest_matches_reference(seed: int):
+    rng = random.Random(seed)
+    large = seed % 4 == 0
+
+    old_versions = [
+        {"version": random_version(rng, large), "changelog": f"old {i}"}
+        for i in range(rng.randrange(0, 30))
+    ]
+    if seed % 2:
+        # Manifests written by jprm are sorted, newest first
+        old_versions = reference_update_plugin_manifest({"versions": []}, {"versions": old_versions})["versions"]
+
+    new_versions = [
+        {"version": jprm.Version(random_version(rng, large)).full(), "changelog": f"new {i}"}
+        for i in range(rng.randrange(1, 4))
+    ]
+
+    old = {"guid": "a", "name": "Old", "versions": old_versions}
+    new = {"guid": "a", "name": "New", "versions": new_versions}
+
+    expected = reference_update_plugin_manifest(copy.deepcopy(old), copy.deepcopy(new))
+    assert jprm.update_plugin_manifest(old, new) == expected
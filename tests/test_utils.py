@@ -1,13 +1,20 @@
 import os
 import sys
 import json
+import logging
+import hashlib
+import zipfile
 from pathlib import Path
 
 import pytest
+import yaml
 import jprm
 
 
 TEST_DATA_DIR = Path(os.path.dirname(os.path.realpath(__file__))) / "data"
+# GUIDs of the plugins in the test data
+GUID_A = "f5ddc434-4b42-45d0-a049-8dda7f1ed30b"
+GUID_B = "64bddcee-f8a0-444b-a467-e51ad47fea63"
 
 
 def json_load(path: Path, **kwargs):
@@ -15,6 +22,31 @@ def json_load(path: Path, **kwargs):
         return json.load(handle, **kwargs)
 
 
+def invoke_repo(cli_runner, *args):
+    """
+    Run `jprm repo` with `args`, and check that it succeeded.
+    """
+    result = cli_runner.invoke(jprm.cli, ["--verbosity=debug", "repo", *map(str, args)])
+    assert result.exit_code == 0, result.output
+    return result
+
+
+def make_repo(cli_runner, manifest_file: Path, *zips: Path, args=(), **config) -> Path:
+    """
+    Initialize a repository at `manifest_file`, with `config` in its `.jprm-repo.yaml`,
+    and `repo add` the plugin `zips` to it, with the extra `args`.
+    """
+    manifest_file.parent.mkdir(parents=True, exist_ok=True)
+    if config:
+        with open(manifest_file.parent / jprm.REPO_CONFIG_FILE, "w") as fh:
+            yaml.safe_dump(config, fh)
+
+    invoke_repo(cli_runner, "init", manifest_file)
+    if zips:
+        invoke_repo(cli_runner, "add", *args, manifest_file, *zips)
+    return manifest_file
+
+
 @pytest.mark.datafiles(
     TEST_DATA_DIR / "jprm.yaml",
     TEST_DATA_DIR / "jprm.json",
@@ -42,6 +74,38 @@ def test_get_config_old(datafiles: Path):
     assert jprm.get_config(datafiles) == json_load(datafiles / "jprm.json")
 
 
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "jprm.yaml",
+    TEST_DATA_DIR / "jprm.json",
+)
+def test_get_config_ci(datafiles: Path):
+    (datafiles / ".ci").mkdir()
+    (datafiles / "jprm.yaml").replace(datafiles / ".ci" / "jprm.yaml")
+    (datafiles / "build.yaml").write_text("[]")
+    assert jprm.find_config_files(datafiles) == [
+        os.path.join(datafiles, ".ci", "jprm.yaml"),
+        os.path.join(datafiles, "build.yaml"),
+    ]
+    assert jprm.get_config(datafiles) == json_load(datafiles / "jprm.json")
+
+
+@pytest.mark.datafiles(
+    TEST_DATA_DIR / "jprm.yaml",
+)
+def test_load_manifest_cache(datafiles: Path):
+    manifest_file = datafiles / "jprm.yaml"
+
+    cfg = jprm.load_manifest(manifest_file)
+    cfg["artifacts"].append("modified.dll")
+    # Callers get a copy of their own
+    assert jprm.load_manifest(manifest_file)["artifacts"] == ["dummy.dll"]
+
+    st = manifest_file.stat()
+    manifest_file.write_text(manifest_file.read_text().replace("Plugin A", "Plugin Z"))
+    os.utime(manifest_file, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert jprm.load_manifest(manifest_file)["name"] == "Plugin Z"
+
+
 def test_invalid_manifest(tmp_path: Path):
     with open(tmp_path / "jprm.yaml", "wt", encoding="utf8") as fh:
         fh.write("]]]")
@@ -121,3 +185,217 @@ def test_version():
         print(ver["__len__"])
 
     assert ver.full() == "3.0.0.0"
+
+
+def test_copyfileobj_checksum(tmp_path: Path):
+    data = os.urandom(3_000_000)
+    (tmp_path / "src.bin").write_bytes(data)
+
+    with open(tmp_path / "src.bin", "rb") as fsrc, open(tmp_path / "dst.bin", "wb") as fdst:
+        checksum = jprm.copyfileobj_checksum(fsrc, fdst)
+
+    assert (tmp_path / "dst.bin").read_bytes() == data
+    assert checksum == jprm.checksum_file(tmp_path / "src.bin")
+
+
+def test_checksum_file_multi(tmp_path: Path):
+    data = os.urandom(2_500_000)
+    (tmp_path / "a.bin").write_bytes(data)
+    (tmp_path / "b.bin").write_bytes(data[:1000])
+
+    assert jprm.checksum_file_multi(tmp_path / "a.bin") == {
+        "md5": hashlib.md5(data).hexdigest(),
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "sha512": hashlib.sha512(data).hexdigest(),
+    }
+    assert jprm.checksum_file(tmp_path / "a.bin", "sha1") == hashlib.sha1(data).hexdigest()
+
+    paths = [tmp_path / "a.bin", tmp_path / "b.bin"]
+    expected = {path: {"md5": hashlib.md5(path.read_bytes()).hexdigest()} for path in paths}
+    assert jprm.checksum_files(paths, jobs=1) == expected
+    assert jprm.checksum_files(paths, jobs=2) == expected
+
+
+def test_version_sort_key():
+    assert jprm.Version("1.2.3.4").sort_key == (1 << 48) | (2 << 32) | (3 << 16) | 4
+    assert jprm.Version("1.2").sort_key == jprm.Version("1.2.0.0").sort_key
+    assert jprm.Version("1.0.0.65536").sort_key is None
+
+    ver = jprm.Version("1.2.3.4")
+    ver.revision = 5
+    assert ver.sort_key == jprm.Version("1.2.3.5").sort_key
+    ver["minor"] = None
+    assert ver.sort_key == jprm.Version("1").sort_key
+
+    # Parts too large for the packed key are compared part by part
+    assert jprm.Version("1.0.0.65536") > jprm.Version("1.0.0.65535")
+    assert jprm.Version("1.0.0.65536") < jprm.Version("1.0.1.0")
+    assert jprm.Version("1.0.0.65536") == jprm.Version("1.0.0.65536")
+
+
+def test_version_parse():
+    ver = jprm.Version.parse("1.2")
+    assert ver is jprm.Version.parse("1.2")
+    assert ver is jprm.Version.parse(ver)
+    assert ver == jprm.Version("1.2.0.0")
+    assert ver.full() == "1.2.0.0"
+    assert str(ver) == "1.2"
+    assert hash(ver) == hash(jprm.Version.parse("1.2.0"))
+
+    with pytest.raises(TypeError):
+        ver.major = 2
+    with pytest.raises(TypeError):
+        ver["minor"] = 3
+    with pytest.raises(TypeError):
+        jprm.Version.parse(3.5)
+
+    copy = jprm.Version(ver)
+    copy.major = 2
+    assert str(copy) == "2.2"
+    assert str(ver) == "1.2"
+
+
+@pytest.mark.parametrize(
+    "versions,expected",
+    [
+        (["1.0", "1.10", "1.2", "1.0.0.0", "0.9"], ["1.10", "1.2", "1.0", "1.0.0.0", "0.9"]),
+        (["1.0.0.65536", "1.0.1", "1.0.0.2"], ["1.0.1", "1.0.0.65536", "1.0.0.2"]),
+    ],
+)
+def test_sort_versions(versions, expected):
+    releases = [{"version": v} for v in versions]
+    jprm.sort_versions(releases, key=lambda release: release["version"], reverse=True)
+    assert [release["version"] for release in releases] == expected
+
+    ascending = sorted(versions, key=jprm.Version)
+    jprm.sort_versions(versions)
+    assert versions == ascending
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_zip_entries(tmp_path: Path, jobs: int):
+    source = tmp_path / "src"
+    (source / "lib").mkdir(parents=True)
+    (source / "lib" / "native.so").write_bytes(b"native library " * 10000)
+    (source / "image.png").write_bytes(b"\x89PNG" + b"\0" * 1000)
+    (source / "random.bin").write_bytes(os.urandom(4096))
+    (source / "empty.txt").write_bytes(b"")
+
+    entries = sorted(jprm.walk_entries(str(source))) + [("meta.json", b'{"name": "Plugin"}')]
+    fn = tmp_path / "out.zip"
+    jprm.zip_entries(str(fn), entries, date_time=(2020, 1, 1, 0, 0, 0), comment=b"comment", jobs=jobs)
+
+    with zipfile.ZipFile(fn) as zf:
+        assert zf.testzip() is None
+        assert zf.comment == b"comment"
+        assert zf.namelist() == ["empty.txt", "image.png", "lib/", "lib/native.so", "random.bin", "meta.json"]
+        info = {i.filename: i for i in zf.infolist()}
+        assert info["lib/native.so"].compress_type == zipfile.ZIP_DEFLATED
+        assert info["image.png"].compress_type == zipfile.ZIP_STORED
+        # Incompressible data is stored
+        assert info["random.bin"].compress_type == zipfile.ZIP_STORED
+        assert zf.read("lib/native.so") == b"native library " * 10000
+        assert zf.read("meta.json") == b'{"name": "Plugin"}'
+
+    serial = tmp_path / "serial.zip"
+    jprm.zip_entries(str(serial), entries, date_time=(2020, 1, 1, 0, 0, 0), comment=b"comment", jobs=1)
+    assert serial.read_bytes() == fn.read_bytes()
+
+    stored = tmp_path / "stored.zip"
+    jprm.zip_entries(str(stored), entries, compresslevel=0, jobs=jobs)
+    with zipfile.ZipFile(stored) as zf:
+        assert zf.testzip() is None
+        assert {i.compress_type for i in zf.infolist()} == {zipfile.ZIP_STORED}
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_zip_entries_spooled(tmp_path: Path, jobs: int, monkeypatch):
+    # Entries larger than the spool size go through temporary files, and are read in chunks
+    monkeypatch.setattr(jprm, "ZIP_SPOOL_SIZE", 1024)
+    source = tmp_path / "src"
+    source.mkdir()
+    native = b"".join(b"native library %d " % i for i in range(200000))
+    (source / "native.so").write_bytes(native)
+    noise = os.urandom(3 * 1_048_576)
+    (source / "noise.bin").write_bytes(noise)
+
+    fn = tmp_path / "out.zip"
+    jprm.zip_entries(str(fn), sorted(jprm.walk_entries(str(source))), date_time=(2020, 1, 1, 0, 0, 0), jobs=jobs)
+
+    with zipfile.ZipFile(fn) as zf:
+        assert zf.testzip() is None
+        info = {i.filename: i for i in zf.infolist()}
+        assert info["native.so"].compress_type == zipfile.ZIP_DEFLATED
+        assert info["native.so"].compress_size < len(native)
+        assert info["noise.bin"].compress_type == zipfile.ZIP_STORED
+        assert zf.read("native.so") == native
+        assert zf.read("noise.bin") == noise
+
+
+def test_run_command_streaming(tmp_path: Path, caplog):
+    script = tmp_path / "noisy.py"
+    script.write_text(
+        "import sys\n"
+        "for i in range(1000):\n"
+        "    print('line', i)\n"
+        "print('oops', file=sys.stderr)\n"
+        "sys.exit(3)\n"
+    )
+
+    with caplog.at_level(logging.INFO, logger="jprm"):
+        result = jprm.run_command_streaming(
+            "{} {}".format(sys.executable, script), cwd=str(tmp_path), tail_lines=10
+        )
+
+    assert result.returncode == 3
+    assert len(result.tail) == 10
+    assert "line 999" in result.tail
+    assert result.stderr_tail == ["oops"]
+    assert result.output.endswith("line 999\noops")
+    assert "line 0" not in result.tail
+    assert "line 0" in caplog.messages
+    assert result.wall_time > 0
+    if hasattr(os, "wait4"):
+        assert result.cpu_time > 0
+
+
+def test_rewrite_project(tmp_path: Path):
+    project = tmp_path / "Plugin.csproj"
+    project.write_text(
+        "<Project>\n"
+        "  <PropertyGroup>\n"
+        "    <TargetFramework>net6.0</TargetFramework>\n"
+        "    <Version>1.0.0.0</Version>\n"
+        "    <AssemblyVersion>1.0.0.0</AssemblyVersion>\n"
+        "  </PropertyGroup>\n"
+        "</Project>\n"
+    )
+
+    old = jprm.rewrite_project(str(project), version="2.1", framework="net8.0")
+    assert old == {
+        "version": "1.0.0.0",
+        "file_version": None,
+        "assembly_version": "1.0.0.0",
+        "framework": "net6.0",
+    }
+    data = project.read_text()
+    assert "<TargetFramework>net8.0</TargetFramework>" in data
+    assert "<Version>2.1.0.0</Version>" in data
+    assert "<AssemblyVersion>2.1.0.0</AssemblyVersion>" in data
+
+    # Nothing to change, the file is not touched
+    os.utime(project, ns=(1_000_000_000, 1_000_000_000))
+    assert jprm.rewrite_projects([str(project)], version="2.1.0.0", framework="net8.0")[0]["version"] == "2.1.0.0"
+    assert project.stat().st_mtime_ns == 1_000_000_000
+
+    assert jprm.set_project_version(str(project), "3.0") == ("2.1.0.0", None, "2.1.0.0")
+    assert jprm.set_project_framework(str(project), "net9.0") == "net8.0"
+
+    project.write_text(data + "<Version>1.0</Version>\n")
+    assert jprm.rewrite_project(str(project), version="4.0") is None
+    assert project.read_text() == data + "<Version>1.0</Version>\n"
+
+    # The framework is still set when the version tags can not be
+    assert jprm.rewrite_project(str(project), version="4.0", framework="net9.0") is None
+    assert project.read_text() == data.replace("net8.0", "net9.0") + "<Version>1.0</Version>\n"
+    assert jprm.set_project_framework(str(project), "net8.0") == "net9.0"